@@ -1,34 +1,61 @@
-from typing import List, Tuple, Dict
+import functools
+import os
+from typing import TYPE_CHECKING, Any, Callable, List, Tuple, Dict
+# Imported first so that the startup timings start with the first script run
+from lib.timing import finish_rerun, instrumented, mark_first_paint, start_rerun, timed
 import streamlit as st
 import pandas as pd
-import nltk
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import ScriptRunContext, add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.state import SafeSessionState, SessionState
 
 # Custom packages
-from lib.preprocessing import prepare_data
-import streamlit_page.generalstats as generalstats
-import streamlit_page.teacherstats as teacherstats
+from lib.preprocessing import TermIndex, build_term_index, dataset_version, load_stop_words, prepare_data
+from lib.aggregation import Cube, build_cube
+from lib.analytics import global_statistics
+from lib.dataset import freeze
+from lib.search import SearchIndex, build_search_index
+from lib.ingest import STORE_PATH
+from lib.warmup import single_flight, start_warmup
+from streamlit_page.debug_panel import debug_enabled, debug_panel
 
-FILE_PATH = 'dataset/subjects_master.csv'
+if TYPE_CHECKING:
+    from lib.profiles import TeacherProfiles
+    from lib.recommendations import TeacherMatrix
+    from lib.themes import Themes
+    from lib.years import YearIndex
+    from lib.word_cloud import WordClouds
 
+FILE_PATH = 'dataset/subjects_master.csv'
+# Resource caches hold one object per dataset version, shared by every session
+# without copies: the current version and the previous one while sessions move over
+MAX_DATASET_VERSIONS = 2
+# Data caches are small derived values, copied per call and expired after a while
+DATA_CACHE_TTL = 3600
+MAX_DATA_CACHE_ENTRIES = 16
 
 
 def main():
-    df, exception = load_external_data(FILE_PATH)
-    glb_stats = global_stats(df)
-    create_layout(df, glb_stats)
+    create_layout()
 
 
-@st.cache
-def load_external_data(path: str) -> Tuple[pd.DataFrame, Exception]:
+@instrumented()
+@single_flight
+@st.experimental_singleton(max_entries=MAX_DATASET_VERSIONS, show_spinner=False)
+def load_external_data(path: str, version: str) -> Tuple[pd.DataFrame, Exception]:
     """ Load data from a link and preprocess it
     Parameters:
     -----------
     path : str
         Path to the data (should be hosted offline)
+    version : str
+        Dataset version token (see lib.preprocessing.dataset_version),
+        a new version loads the data again
     Returns:
     --------
     df : pandas.core.frame.DataFrame | False
-        The data loaded and preprocessed.
+        The data loaded and preprocessed, shared by all the sessions so
+        its arrays are read-only (see lib.dataset).
         If there is an issue loading/preprocessing then it
         returns False instead.
     exception : False | Exception
@@ -37,20 +64,151 @@ def load_external_data(path: str) -> Tuple[pd.DataFrame, Exception]:
     """
 
     try:
-        df = prepare_data(path)
+        with timed('load_external_data'):
+            df = freeze(prepare_data(path))
         return df, False
     except Exception as exception:
         print("failed to load data")
         return False, exception
 
 
-@st.cache
-def global_stats(df: pd.DataFrame) -> Dict:
+@instrumented()
+@single_flight
+@st.experimental_singleton(max_entries=MAX_DATASET_VERSIONS, show_spinner=False)
+def load_aggregates(path: str, version: str) -> Cube:
+    """ Aggregate the data once, right after it is loaded
+    Parameters:
+    -----------
+    path : str
+        Path to the data (should be hosted offline)
+    version : str
+        Dataset version token
+    Returns:
+    --------
+    cube : Cube
+        The pre-aggregated counts used by the General Statistics page.
+        Keyed on the path and version so the data itself never has to be hashed.
+    """
+
+    df, exception = load_external_data(path, version)
+    with timed('load_aggregates'):
+        return build_cube(df)
+
+
+@instrumented()
+@single_flight
+@st.experimental_singleton(max_entries=MAX_DATASET_VERSIONS, show_spinner=False)
+def load_term_index(path: str, version: str) -> TermIndex:
+    """ Tokenize the subject titles once
+    Parameters:
+    -----------
+    path : str
+        Path to the data (should be hosted offline)
+    version : str
+        Dataset version token
+    Returns:
+    --------
+    index : TermIndex
+        The document-term matrix and inverted index of the titles.
+    """
+
+    df, exception = load_external_data(path, version)
+    with timed('load_term_index'):
+        return build_term_index(df['Title'], load_stop_words())
+
+
+@instrumented()
+@single_flight
+@st.experimental_singleton(max_entries=MAX_DATASET_VERSIONS, show_spinner=False)
+def load_year_index(path: str, version: str) -> 'YearIndex':
+    """ Academic years of the data and their aggregates, only the years
+    whose subjects changed are aggregated again for a new version """
+
+    from lib.years import build_year_index
+    df, exception = load_external_data(path, version)
+    cube = load_aggregates(path, version)
+    with timed('load_year_index'):
+        return build_year_index(df, cube)
+
+
+@instrumented()
+@single_flight
+@st.experimental_singleton(max_entries=MAX_DATASET_VERSIONS, show_spinner=False)
+def load_teacher_profiles(path: str, version: str) -> 'TeacherProfiles':
+    """ Profiles of every teacher for the Teacher Statistics page, built on
+    first lookup so that switching back to a teacher is a dictionary read """
+
+    from lib.profiles import build_teacher_profiles
+    df, exception = load_external_data(path, version)
+    cube = load_aggregates(path, version)
+    index = load_term_index(path, version)
+    with timed('load_teacher_profiles'):
+        return build_teacher_profiles(df, cube, index)
+
+
+@instrumented()
+@single_flight
+@st.experimental_singleton(max_entries=MAX_DATASET_VERSIONS, show_spinner=False)
+def load_word_clouds(path: str, version: str) -> 'WordClouds':
+    """ Word clouds of the subject titles, they hold the (bounded, thread
+    safe) cache of the rendered images """
+
+    with timed('import wordcloud'):
+        from lib.word_cloud import build_word_clouds
+    return build_word_clouds(load_term_index(path, version))
+
+
+@instrumented()
+@single_flight
+@st.experimental_singleton(max_entries=MAX_DATASET_VERSIONS, show_spinner=False)
+def load_themes(path: str, version: str) -> 'Themes':
+    """ Themes of the subjects, read from the model stored next to the data
+    (see lib.themes), only the years the model has not seen are learnt again """
+
+    from lib.themes import build_themes, theme_model_path
+    df, exception = load_external_data(path, version)
+    index = load_term_index(path, version)
+    with timed('load_themes'):
+        return build_themes(df, index, theme_model_path(path), version)
+
+
+@instrumented()
+@single_flight
+@st.experimental_singleton(max_entries=MAX_DATASET_VERSIONS, show_spinner=False)
+def load_teacher_matrix(path: str, version: str) -> 'TeacherMatrix':
+    """ Features of the teachers, their most similar teachers and the teachers
+    of every speciality, read from the file stored next to the data """
+
+    from lib.recommendations import build_teacher_matrix, teacher_matrix_path
+    df, exception = load_external_data(path, version)
+    index = load_term_index(path, version)
+    with timed('load_teacher_matrix'):
+        return build_teacher_matrix(df, index, teacher_matrix_path(path), version)
+
+
+@instrumented()
+@single_flight
+@st.experimental_singleton(max_entries=MAX_DATASET_VERSIONS, show_spinner=False)
+def load_search_index(path: str, version: str) -> SearchIndex:
+    """ Ranking index of the subject titles for the search page """
+
+    index = load_term_index(path, version)
+    with timed('load_search_index'):
+        return build_search_index(index)
+
+
+@instrumented()
+@single_flight
+@st.experimental_memo(ttl=DATA_CACHE_TTL, max_entries=MAX_DATA_CACHE_ENTRIES, show_spinner=False)
+def global_stats(_df: pd.DataFrame, version: str) -> Dict:
     """ extract global stats to use it in the pages
     Parameters
     ----------
-    df : pandas.core.frame.DataFrame
+    _df : pandas.core.frame.DataFrame
         The data to be used for the analyses of thesis subjects.
+        Not hashed (leading underscore), the cache is keyed on version.
+    version : str
+        Dataset version token of the data
     Returns
     -------
     dictionary in the form 'global_stat_name:value'
@@ -58,27 +216,65 @@ def global_stats(df: pd.DataFrame) -> Dict:
 
     """
 
-    nltk.download('stopwords')
-    st.set_option('deprecation.showPyplotGlobalUse', False)
-    number_of_topics = df.shape[0]
-    number_of_topics_taken = df['Taken'].value_counts()[0]
-    number_of_topics_not_taken = number_of_topics - number_of_topics_taken
-    percentage_of_taken = round(number_of_topics_taken / number_of_topics * 100)
-    # percentage_of_not_taken = round(number_of_topics_not_taken / number_of_topics * 100)
-    number_of_teachers = len(df['Teacher'].unique())
-    average_publish_number = round(df['Teacher'].value_counts().to_frame().reset_index().Teacher.mean())
-    speciality_list = list(df['Priority 1'].unique())
-
-    teacher_list = list(df['Teacher'].unique())
-    return {
-        'number of topics': number_of_topics,
-        'number of topics taken': number_of_topics_taken,
-        'percentage of taken': percentage_of_taken,
-        'teacher list': teacher_list,
-        'average publish': average_publish_number,
-        'speciality list': speciality_list,
-
-    }
+    return global_statistics(_df)
+
+
+def warm_up_word_clouds(path: str, version: str) -> None:
+    """ Draw the word clouds every visit of the pages starts with: of every
+    year option, and of the first teacher of the list for every year option """
+
+    from lib.profiles import teacher_profile
+    from lib.word_cloud import word_cloud_image
+    from lib.years import ALL_YEARS, year_options
+    year_index = load_year_index(path, version)
+    word_clouds = load_word_clouds(path, version)
+    profiles = load_teacher_profiles(path, version)
+    for year in year_options(year_index):
+        rows = None if year == ALL_YEARS else year_index.rows[year]
+        # Same keys as the pages (see streamlit_page/generalstats.py and teacherstats.py)
+        word_cloud_image(word_clouds, key=('year', year), rows=rows)
+        profile = teacher_profile(profiles, profiles.teachers[0], None if year == ALL_YEARS else year)
+        if profile is not None:
+            word_cloud_image(word_clouds, key=('teacher', profiles.teachers[0], year), frequencies=profile.top_terms)
+
+
+def warmup_steps(path: str, version: str) -> List[Tuple[str, Callable[[], Any]]]:
+    """ Everything the first visit of a page would wait for, the data first """
+
+    def loader(function: Callable) -> Tuple[str, Callable[[], Any]]:
+        return function.__name__, functools.partial(function, path, version)
+
+    return [
+        loader(load_external_data),
+        ('global_stats', lambda: global_stats(load_external_data(path, version)[0], version)),
+        loader(load_aggregates),
+        loader(load_term_index),
+        loader(load_year_index),
+        loader(load_teacher_profiles),
+        loader(load_word_clouds),
+        ('word cloud images', functools.partial(warm_up_word_clouds, path, version)),
+        loader(load_search_index),
+        loader(load_themes),
+        loader(load_teacher_matrix),
+    ]
+
+
+def warmup_context(ctx: ScriptRunContext) -> ScriptRunContext:
+    """ The script run context of the warm-up threads, attached to no session
+
+    The caches only store the results computed with a context. Whatever the steps
+    would send to the browser (a spinner, a warning) is dropped instead of
+    reaching the session whose script run started the warm-up.
+    """
+
+    return ScriptRunContext(session_id='warmup', _enqueue=lambda msg: None, query_string='',
+                            session_state=SafeSessionState(SessionState()),
+                            uploaded_file_mgr=ctx.uploaded_file_mgr, page_script_hash='', user_info={'email': None})
+
+
+def data_path() -> str:
+    """ The partitioned dataset store once topics were ingested (see lib.ingest), else the csv """
+    return STORE_PATH if os.path.isdir(STORE_PATH) else FILE_PATH
 
 
 def load_homepage() -> None:
@@ -108,39 +304,79 @@ The dashboard can answer some following questions, among other things:
 
     for i in range(3):
         st.write(" ")
-    st.write("There are currently two pages available in the application:")
+    st.write("There are currently five pages available in the application:")
     st.subheader("📄 General Statistics 📄")
     st.markdown("* This page contains basic exploratory data analyses for the purpose"
                 " of getting a general feeling of what the data contains.")
     st.subheader("📄 Teacher Statistics 📄") #TODO: 
     st.markdown("* This page contains additional information about each teacher. ") 
+    st.subheader("📄 Subject Search 📄")
+    st.markdown("* This page finds proposed subjects by keywords.")
+    st.subheader("📄 Academic Year Trends 📄")
+    st.markdown("* This page compares the topics and the prioritizing of the specialities across academic years.")
+    st.subheader("📄 Teacher Finder 📄")
+    st.markdown("* This page ranks the teachers whose subjects fit a speciality.")
 
 
-def create_layout(df: pd.DataFrame, glb_stats: Dict) -> None:
-    """ Create the layout after the data has successfully loaded
-    Parameters:
-    -----------
-    df : pandas.core.frame.DataFrame
-        The data to be used for the analyses of thesis subjects.
-    glb_stats: Dict
-        dictionary in the form 'global_stat_name:value'
+def create_layout() -> None:
+    """ Create the layout of the selected page
+
+    The data, its indexes and the page modules (with their visualization
+    libraries) are only loaded once a page that needs them is selected,
+    so the Homepage is shown without waiting for any of them.
     """
 
     st.sidebar.title("Menu")
     app_mode = st.sidebar.selectbox("Please select a page", ["Homepage",
                                                              "General Statistics",
                                                              "Teacher Statistics",
+                                                             "Subject Search",
+                                                             "Academic Year Trends",
+                                                             "Teacher Finder",
                                                              ])
+    start_rerun(app_mode)
+    path = data_path()
+    version = dataset_version(path)
+    # Without a Streamlit server (bare mode) nothing is cached, there is nothing to warm up
+    if runtime.exists():
+        start_warmup((path, version), warmup_steps(path, version), max_warmups=MAX_DATASET_VERSIONS,
+                     initializer=functools.partial(add_script_run_ctx, None, warmup_context(get_script_run_ctx())))
     if app_mode == 'Homepage':
         load_homepage()
     elif app_mode == "Instruction":
         body = " ".join(open("files/instructions.md", 'r').readlines())
         st.markdown(body, unsafe_allow_html=True)
     elif app_mode == "General Statistics":
-        generalstats.load_page(df)
+        with timed('import generalstats'):
+            import streamlit_page.generalstats as generalstats
+        df, exception = load_external_data(path, version)
+        generalstats.load_page(df, load_aggregates(path, version), load_year_index(path, version),
+                               load_word_clouds(path, version))
     elif app_mode == "Teacher Statistics":
-
-        teacherstats.load_page(df, glb_stats)
+        with timed('import teacherstats'):
+            import streamlit_page.teacherstats as teacherstats
+        df, exception = load_external_data(path, version)
+        teacherstats.load_page(df, global_stats(df, version), load_teacher_profiles(path, version),
+                               load_year_index(path, version), load_word_clouds(path, version),
+                               load_themes(path, version), load_teacher_matrix(path, version))
+    elif app_mode == "Subject Search":
+        with timed('import subjectsearch'):
+            import streamlit_page.subjectsearch as subjectsearch
+        df, exception = load_external_data(path, version)
+        subjectsearch.load_page(df, global_stats(df, version), load_search_index(path, version),
+                                load_year_index(path, version))
+    elif app_mode == "Academic Year Trends":
+        with timed('import yeartrends'):
+            import streamlit_page.yeartrends as yeartrends
+        yeartrends.load_page(load_year_index(path, version))
+    elif app_mode == "Teacher Finder":
+        with timed('import teacherfinder'):
+            import streamlit_page.teacherfinder as teacherfinder
+        teacherfinder.load_page(load_teacher_matrix(path, version))
+    record = finish_rerun()
+    if debug_enabled():
+        debug_panel(record)
+    mark_first_paint(app_mode)
 
 
 
@@ -0,0 +1,277 @@
+"""Benchmark suite
+
+Times the load, aggregation and render paths of the dashboard on synthetic datasets
+(see benchmarks.synthetic) and stores the results as json, so that the timings of two
+versions can be compared. The memory a session allocates is measured too, and checked
+against the documented ceiling (see lib.dataset.session_memory_ceiling).
+
+Usage: python -m benchmarks.run --sizes 1000 100000 1000000 --label my-branch
+       python -m benchmarks.run --sizes 1000 --compare benchmarks/results/my-branch.json
+
+The results are compared with the committed baseline (BASELINE_PATH) by default,
+refresh it with --label baseline when a change moves the timings on purpose.
+
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate
+from lib.aggregation import build_cube
+from lib.analytics import (external_department_counts, global_statistics, grade_counts, priority_scores,
+                           taken_ratio, teacher_counts)
+from lib.dataset import SELECTION_COLUMNS, freeze, row_positions, session_memory_ceiling, take
+from lib.dedup import near_duplicate_clusters
+from lib.preprocessing import (build_term_index, cloud_frequencies, load_stop_words, normalize_text,
+                               normalized_stop_words, prepare_data)
+from lib.profiles import build_teacher_profiles, teacher_profile
+from lib.recommendations import build_teacher_matrix, nearest_teachers, recommended_teachers
+from lib.search import build_search_index, search
+from lib.topics import filter_rows, page_rows, sort_rows
+from lib.years import build_year_index
+
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+BASELINE_PATH = os.path.join(RESULTS_DIR, 'baseline.json')
+# Pairs of titles known to be near-duplicates or different subjects (see lib.dedup)
+NEAR_DUPLICATES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'near_duplicates.csv')
+SIZES = [1000, 100000, 1000000]
+# Steps faster than this are repeated and the best time is kept
+REPEAT_BELOW = 0.2
+REPEATS = 5
+QUERY = 'deep learning'
+
+
+def measure(function: Callable) -> float:
+    """ Best wall time of a call in seconds, fast calls are repeated """
+    start = time.perf_counter()
+    function()
+    best = time.perf_counter() - start
+    if best < REPEAT_BELOW:
+        for _ in range(REPEATS - 1):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(function: Callable) -> int:
+    """ Peak number of bytes allocated during a call """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def session_memory(df: pd.DataFrame, search_index) -> Dict[str, int]:
+    """ Bytes allocated by the largest selection of a page and by a search, raises a
+    ValueError when together they exceed lib.dataset.session_memory_ceiling """
+    selection = 0
+    for column in SELECTION_COLUMNS:
+        largest = df[column].value_counts().index[0]
+        selection = max(selection, peak_memory(lambda: take(df, row_positions(df, column, largest))))
+    mask = np.ones(len(df.index), dtype=bool)
+    searching = max(peak_memory(lambda: search(search_index, QUERY)),
+                    peak_memory(lambda: search(search_index, QUERY, mask=mask)))
+    memory = {'largest selection': selection, 'search': searching, 'ceiling': session_memory_ceiling(df)}
+    if selection + searching > memory['ceiling']:
+        raise ValueError(f'a session allocates {selection + searching} bytes, '
+                         f'above its ceiling of {memory["ceiling"]} bytes')
+    return memory
+
+
+def benchmark_size(number_of_rows: int, data_dir: str) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """ Time every step of the dashboard on a synthetic dataset of the given size
+
+    Parameters:
+    -----------
+
+    number_of_rows : int
+    data_dir : str
+        Directory of the generated csv (and of its columnar cache).
+
+    Returns:
+    --------
+
+    timings : dict
+        In the form 'step:seconds'.
+    memory : dict
+        The bytes allocated by a session and their ceiling (see session_memory).
+    """
+
+    path = os.path.join(data_dir, f'subjects_{number_of_rows}.csv')
+    if not os.path.exists(path):
+        generate(number_of_rows).to_csv(path, index=None)
+    timings = {}
+
+    def step(name: str, function: Callable) -> None:
+        timings[name] = measure(function)
+        print(f'  {name}: {timings[name]:.4f}s', flush=True)
+
+    step('prepare_data (csv)', lambda: prepare_data(path, use_cache=False))
+    prepare_data(path)
+    step('prepare_data (columnar cache)', lambda: prepare_data(path))
+    df = freeze(prepare_data(path))
+    step('near_duplicate_clusters', lambda: near_duplicate_clusters(normalize_text(df['Title']),
+                                                                    normalized_stop_words()))
+
+    step('global_stats', lambda: global_statistics(df))
+    step('build_cube', lambda: build_cube(df))
+    cube = build_cube(df)
+    step('build_term_index', lambda: build_term_index(df['Title'], load_stop_words()))
+    index = build_term_index(df['Title'], load_stop_words())
+    step('build_search_index', lambda: build_search_index(index))
+    search_index = build_search_index(index)
+    step('build_year_index', lambda: build_year_index(df, cube))
+    year_index = build_year_index(df, cube)
+    step('build_teacher_profiles', lambda: build_teacher_profiles(df, cube, index))
+    profiles = build_teacher_profiles(df, cube, index)
+    step('build_teacher_matrix', lambda: build_teacher_matrix(df, index))
+    matrix = build_teacher_matrix(df, index)
+
+    # General Statistics page, all the years and the most recent one
+    last_year = year_index.aggregates[year_index.years[-1]].cube
+    for name, function in (('taken_ratio', taken_ratio), ('teacher_counts', teacher_counts),
+                           ('grade_counts', grade_counts), ('external_department_counts', external_department_counts),
+                           ('priority_scores', priority_scores)):
+        step(f'generalstats: {name}', lambda: function(cube))
+        step(f'generalstats: {name} (one year)', lambda: function(last_year))
+
+    # Teacher Statistics page, for the teacher with the most topics
+    teacher = df['Teacher'].value_counts().index[0]
+    # A profile is built on its first lookup, then read from the profiles
+    step('teacherstats: first profile lookup', lambda: teacher_profile(profiles._replace(profiles={}), teacher))
+    step('teacherstats: profile lookup', lambda: teacher_profile(profiles, teacher))
+    rows = teacher_profile(profiles, teacher).rows
+
+    def topics_page() -> None:
+        selected = sort_rows(df, filter_rows(df, rows, {'Taken': True}), 'Title')
+        take(df, page_rows(selected, 1), ['Title', 'Taken', 'Priority 1', 'Academic-year'])
+
+    step('teacherstats: topics table page', topics_page)
+    step('teacherstats: similar teachers', lambda: nearest_teachers(matrix, teacher))
+    step('teacherfinder: recommended teachers', lambda: recommended_teachers(matrix, matrix.specialities[0]))
+
+    step('word cloud: frequencies (all)', lambda: cloud_frequencies(index))
+    step('word cloud: frequencies (teacher)', lambda: cloud_frequencies(index, rows))
+    try:
+        from lib.word_cloud import render_word_cloud
+    except ImportError:
+        print('  word cloud: render skipped (wordcloud is not installed)')
+    else:
+        frequencies = cloud_frequencies(index)
+        step('word cloud: render', lambda: render_word_cloud(frequencies))
+
+    step('search: query', lambda: search(search_index, QUERY))
+    mask = np.zeros(len(df.index), dtype=bool)
+    mask[year_index.rows[year_index.years[-1]]] = True
+    step('search: query (one year)', lambda: search(search_index, QUERY, mask=mask))
+
+    memory = session_memory(df, search_index)
+    print('  session memory: ' + ', '.join(f'{name} {size / 1e6:.2f}MB' for name, size in memory.items()), flush=True)
+    return timings, memory
+
+
+def check_near_duplicates(path: str = NEAR_DUPLICATES_PATH) -> None:
+    """ Raise a ValueError listing the pairs of the fixture clustered against their label """
+    pairs = pd.read_csv(path)
+    titles = normalize_text(pd.concat([pairs['first'], pairs['second']], ignore_index=True))
+    clusters = near_duplicate_clusters(titles, normalized_stop_words())
+    clustered = clusters[:len(pairs)] == clusters[len(pairs):]
+    wrong = pairs[clustered != pairs['near_duplicate'].to_numpy()]
+    if len(wrong):
+        raise ValueError('near-duplicate fixture failed:\n' + wrong.to_string(index=False))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run(sizes: List[int], data_dir: str) -> Dict:
+    """ Benchmark every size, along with a description of the environment """
+    # A faster clustering that gets the known pairs wrong is not worth timing
+    check_near_duplicates()
+    results = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'sizes': {},
+        'memory': {},
+    }
+    for number_of_rows in sizes:
+        print(f'{number_of_rows} rows', flush=True)
+        results['sizes'][str(number_of_rows)], results['memory'][str(number_of_rows)] = \
+            benchmark_size(number_of_rows, data_dir)
+    return results
+
+
+def compare(results: Dict, baseline: Dict) -> pd.DataFrame:
+    """ Timings of both runs side by side, with their ratio (above 1 is slower than the baseline) """
+    frames = []
+    for size, timings in results['sizes'].items():
+        before = baseline['sizes'].get(size, {})
+        frames.append(pd.DataFrame({
+            'rows': int(size),
+            'step': list(timings),
+            'baseline (s)': [before.get(name, np.nan) for name in timings],
+            'current (s)': list(timings.values()),
+        }))
+    comparison = pd.concat(frames, ignore_index=True)
+    comparison['ratio'] = (comparison['current (s)'] / comparison['baseline (s)']).round(2)
+    return comparison
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard on synthetic datasets')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='numbers of rows')
+    parser.add_argument('--label', default=None, help='name of the results file (default: the git commit)')
+    parser.add_argument('--data-dir', default=None, help='keep the generated datasets in this directory')
+    parser.add_argument('--compare', default=BASELINE_PATH, help='results file to compare with')
+    args = parser.parse_args()
+
+    # Read first, the run may replace the baseline
+    baseline = None
+    if os.path.exists(args.compare):
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    else:
+        print(f'{args.compare} not found, nothing to compare with')
+
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+        results = run(args.sizes, args.data_dir)
+    else:
+        with tempfile.TemporaryDirectory() as data_dir:
+            results = run(args.sizes, data_dir)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = os.path.join(RESULTS_DIR, f"{args.label or results['commit'] or 'results'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+    print(f'results written to {output}')
+
+    if baseline is not None:
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(compare(results, baseline).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Synthetic dataset generator
+
+Writes csv files shaped like dataset/subjects_master.csv (Title, Teacher, Grade,
+Taken, Priority 1-5, Academic-year) at any size, so that the dashboard can be
+benchmarked beyond one department. The titles are drawn from the words of the
+real titles, the number of teachers and of academic years grows with the size.
+
+Usage: python -m benchmarks.synthetic 100000 --output /tmp/subjects_100k.csv
+
+"""
+import argparse
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from lib.preprocessing import TOKEN_PATTERN
+
+SOURCE_PATH = os.path.join('dataset', 'subjects_master.csv')
+SPECIALITIES = ['F3I', 'GL', 'IDTW', 'IFIA', 'RSD']
+GRADES = ['Maitre assistant classe A', 'Maitre assistant classe B', 'Maitre de conferences classe A',
+          'Maitre de conferences classe B', 'Professeur']
+EXTERNAL_GRADE = '{}) --> Hors département: Faculté {}'
+# A teacher proposes a few topics per year, a department about 150
+TOPICS_PER_TEACHER = 4
+TOPICS_PER_YEAR = 150
+MAX_YEARS = 20
+FIRST_YEAR = 2022
+TAKEN_RATE = 0.9
+EXTERNAL_RATE = 0.05
+WORDS_PER_TITLE = (3, 12)
+
+
+def title_words(source: str = SOURCE_PATH) -> List[str]:
+    """ The words of the real titles, or placeholder words when the dataset is missing """
+    if os.path.exists(source):
+        titles = pd.read_csv(source, usecols=['Title'])['Title'].dropna()
+        words = titles.str.findall(TOKEN_PATTERN).explode().dropna()
+        return words.tolist()
+    return [f'word{number}' for number in range(2000)]
+
+
+def generate(number_of_rows: int, seed: int = 0, source: str = SOURCE_PATH) -> pd.DataFrame:
+    """ Generate topics in the schema of the analysis csv
+
+    Parameters:
+    -----------
+
+    number_of_rows : int
+    seed : int
+        Seed of the random generator, the same seed gives the same data.
+    source : str
+        The real dataset the title words are drawn from.
+
+    Returns:
+    --------
+
+    df : pandas.core.frame.DataFrame
+    """
+
+    rng = np.random.default_rng(seed)
+    number_of_years = int(np.clip(number_of_rows // TOPICS_PER_YEAR, 2, MAX_YEARS))
+    number_of_teachers = max(number_of_rows // (number_of_years * TOPICS_PER_TEACHER), 10)
+
+    # Words are drawn with their frequency in the real titles
+    words = np.array(title_words(source), dtype=object)
+    lengths = rng.integers(*WORDS_PER_TITLE, size=number_of_rows)
+    drawn = words[rng.integers(0, len(words), size=lengths.sum())]
+    titles = [' '.join(title) for title in np.split(drawn, np.cumsum(lengths)[:-1])]
+
+    teacher_grades = np.array(GRADES, dtype=object)[rng.integers(0, len(GRADES), size=number_of_teachers)]
+    external = rng.random(number_of_teachers) < EXTERNAL_RATE
+    teacher_grades[external] = [EXTERNAL_GRADE.format(grade, number % 5)
+                                for number, grade in enumerate(teacher_grades[external])]
+    teachers = rng.integers(0, number_of_teachers, size=number_of_rows)
+    years = rng.integers(0, number_of_years, size=number_of_rows)
+
+    # Every topic ranks the five specialities: one random permutation per row
+    priorities = np.argsort(rng.random((number_of_rows, len(SPECIALITIES))), axis=1)
+    specialities = np.array(SPECIALITIES, dtype=object)[priorities]
+
+    df = pd.DataFrame({
+        'Title': titles,
+        'Teacher': pd.Series(teachers).map(lambda teacher: f'TEACHER{teacher:06d}  X'),
+        'Grade': teacher_grades[teachers],
+        'Taken': rng.random(number_of_rows) < TAKEN_RATE,
+    })
+    for rank in range(len(SPECIALITIES)):
+        df[f'Priority {rank + 1}'] = specialities[:, rank]
+    start = FIRST_YEAR - number_of_years + 1 + years
+    df['Academic-year'] = pd.Series(start).astype(str) + '-' + pd.Series(start + 1).astype(str)
+    return df
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate a synthetic dataset of proposed topics')
+    parser.add_argument('rows', type=int, help='number of topics')
+    parser.add_argument('--output', required=True, help='csv file to write')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.rows, args.seed).to_csv(args.output, index=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from lib.dataset import count_priorities, priority_matrix
+from lib.preprocessing import DERIVED_COLUMNS, PRIORITY_COLUMNS
+
+CUBE_KEYS = ['Academic-year', 'Teacher', 'Grade', 'Taken']
+
+
+class Cube(NamedTuple):
+    """ Pre-aggregated counts of the subjects
+
+    subjects : pandas.core.frame.DataFrame
+        Number of subjects ('count') per Academic-year, Teacher, Grade and Taken,
+        along with the columns derived from the Grade.
+    priorities : pandas.core.frame.DataFrame
+        Number of subjects ('count') per Academic-year, Teacher, Grade, Taken,
+        Priority (1 to 5) and Speciality.
+    """
+    subjects: pd.DataFrame
+    priorities: pd.DataFrame
+
+
+def build_cube(df: pd.DataFrame) -> Cube:
+    """ Aggregate the subjects once so that the pages only scan groups instead of rows
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The preprocessed data (see lib.preprocessing.prepare_data).
+
+    Returns:
+    --------
+
+    cube : Cube
+    """
+
+    groups = df.groupby(CUBE_KEYS, observed=True)
+    subjects = groups.size().rename('count').reset_index()
+    keys = subjects[CUBE_KEYS]
+    # The derived columns only depend on the Grade, join them instead of grouping on them
+    grades = df.drop_duplicates('Grade')[['Grade'] + DERIVED_COLUMNS]
+    subjects = subjects.merge(grades, on='Grade', how='left')
+
+    # Every (rank, group, speciality) is counted in one pass over the priority codes
+    matrix = priority_matrix(df)
+    counts = count_priorities(matrix, groups.ngroup().fillna(-1).to_numpy(dtype=np.int64), len(keys.index))
+    ranks, group, speciality = np.nonzero(counts)
+    priorities = keys.take(group).reset_index(drop=True)
+    priorities['Priority'] = ranks.astype(np.int64) + 1
+    priorities['Speciality'] = pd.Categorical.from_codes(speciality, matrix.specialities).remove_unused_categories()
+    priorities['count'] = counts[ranks, group, speciality]
+    return Cube(subjects=subjects, priorities=priorities)
+
+
+def slice_cube(cube: Cube, year: Optional[str] = None, teacher: Optional[str] = None,
+               grade: Optional[str] = None) -> Cube:
+    """ Restrict the cube to an academic year, a teacher and/or a grade (None means all) """
+    subjects, priorities = cube
+    for column, value in (('Academic-year', year), ('Teacher', teacher), ('Grade', grade)):
+        if value is not None:
+            subjects = subjects[subjects[column] == value]
+            priorities = priorities[priorities[column] == value]
+    return Cube(subjects=subjects, priorities=priorities)
+
+
+def count_by(frame: pd.DataFrame, column: str) -> pd.Series:
+    """ Total count per value of a column of a cube frame, most frequent first
+
+    Parameters:
+    -----------
+
+    frame : pandas.core.frame.DataFrame
+        One of the frames of a Cube.
+    column : str
+        The dimension to count over.
+
+    Returns:
+    --------
+
+    counts : pandas.core.series.Series
+        Counts indexed by the values of the column, values with no subjects are left out.
+    """
+    counts = frame.groupby(column, observed=True)['count'].sum()
+    return counts[counts > 0].sort_values(ascending=False)
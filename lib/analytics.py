@@ -0,0 +1,216 @@
+"""Analytics
+
+The statistics shown by the dashboard, computed without Streamlit so that they can
+be reused by the pages, benchmarked, or precomputed in batch for every filter.
+
+Usage: python -m lib.analytics dataset/subjects_master.csv --output reports/statistics.json
+
+"""
+import argparse
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from lib.aggregation import Cube, build_cube, count_by
+from lib.preprocessing import TermIndex, build_term_index, cloud_frequencies, dataset_version, load_stop_words, \
+    prepare_data
+from lib.profiles import build_teacher_profiles, teacher_profile
+from lib.scoring import speciality_scores
+from lib.years import ALL_YEARS, build_year_index
+
+TOP_TERMS = 50
+REPORT_COLUMNS = ['Academic-year', 'Teacher', 'statistic', 'label', 'value']
+
+
+def global_statistics(df: pd.DataFrame) -> Dict:
+    """ extract global stats to use it in the pages
+    Parameters
+    ----------
+    df : pandas.core.frame.DataFrame
+        The data to be used for the analyses of thesis subjects.
+    Returns
+    -------
+    dictionary in the form 'global_stat_name:value'
+    """
+
+    taken = taken_summary(df.shape[0], int(df['Taken'].sum()))
+    average_publish_number = round(df['Teacher'].value_counts().to_frame().reset_index().Teacher.mean())
+    speciality_list = list(df['Priority 1'].unique())
+
+    teacher_list = list(df['Teacher'].unique())
+    return {
+        'number of topics': int(taken['topics']),
+        'number of topics taken': int(taken['taken']),
+        'percentage of taken': int(taken['percentage of taken']),
+        'teacher list': teacher_list,
+        'average publish': average_publish_number,
+        'speciality list': speciality_list,
+        'number of distinct topics': count_distinct(df),
+        'average distinct publish': round(distinct_teacher_counts(df).mean()),
+    }
+
+
+def taken_ratio(cube: Cube) -> pd.Series:
+    """ Number of topics, taken and not taken, and their percentages """
+    number_of_topics = int(cube.subjects['count'].sum())
+    number_of_topics_taken = int(cube.subjects.loc[cube.subjects['Taken'], 'count'].sum())
+    return taken_summary(number_of_topics, number_of_topics_taken)
+
+
+def taken_summary(number_of_topics: int, number_of_topics_taken: int) -> pd.Series:
+    number_of_topics_not_taken = number_of_topics - number_of_topics_taken
+    return pd.Series({
+        'topics': number_of_topics,
+        'taken': number_of_topics_taken,
+        'not taken': number_of_topics_not_taken,
+        'percentage of taken': round(number_of_topics_taken / max(number_of_topics, 1) * 100),
+        'percentage of not taken': round(number_of_topics_not_taken / max(number_of_topics, 1) * 100),
+    })
+
+
+def teacher_counts(cube: Cube) -> pd.Series:
+    """ Number of topics proposed by every teacher, most first """
+    return count_by(cube.subjects, 'Teacher')
+
+
+def grade_counts(cube: Cube) -> pd.Series:
+    """ Number of topics proposed by every grade, most first """
+    return count_by(cube.subjects, 'GradeBase')
+
+
+def external_department_counts(cube: Cube) -> pd.Series:
+    """ Number of topics proposed by teachers of every other department, most first """
+    return count_by(cube.subjects[cube.subjects['IsExternal']], 'Department')
+
+
+def count_distinct(df: pd.DataFrame, rows: Optional[np.ndarray] = None) -> int:
+    """ Number of distinct subjects, near-duplicate titles counted once (see lib.dedup) """
+    clusters = df['Cluster'].to_numpy()
+    return len(np.unique(clusters if rows is None else clusters[rows]))
+
+
+def distinct_teacher_counts(df: pd.DataFrame, rows: Optional[np.ndarray] = None) -> pd.Series:
+    """ Number of distinct subjects proposed by every teacher, most first
+
+    A subject proposed again by the same teacher with small edits (or another
+    year) is counted once, see lib.dedup.
+    """
+
+    teachers = df['Teacher'].cat.codes.to_numpy().astype(np.int64)
+    clusters = df['Cluster'].to_numpy().astype(np.int64)
+    if rows is not None:
+        teachers, clusters = teachers[rows], clusters[rows]
+    pairs = np.unique(teachers * len(df.index) + clusters)
+    counts = pd.Series(np.bincount(pairs // len(df.index), minlength=len(df['Teacher'].cat.categories)),
+                       index=df['Teacher'].cat.categories, name='count')
+    counts.index.name = 'Teacher'
+    return counts[counts > 0].sort_values(ascending=False)
+
+
+def priority_scores(cube: Cube) -> pd.DataFrame:
+    """ Rank statistics of every speciality (see lib.scoring.speciality_scores) """
+    return speciality_scores(cube)
+
+
+def term_frequencies(index: TermIndex, rows: Optional[np.ndarray] = None, limit: int = TOP_TERMS) -> pd.Series:
+    """ The most frequent terms of the titles, bigrams counted apart from their words """
+    return cloud_frequencies(index, rows).nlargest(limit, keep='first')
+
+
+def cube_statistics(cube: Cube, index: TermIndex, rows: Optional[np.ndarray]) -> Dict[str, pd.Series]:
+    """ Every statistic of the General Statistics page for a (sliced) cube """
+    statistics = {
+        'taken': taken_ratio(cube),
+        'topics per teacher': teacher_counts(cube),
+        'topics per grade': grade_counts(cube),
+        'topics per external department': external_department_counts(cube),
+        'terms': term_frequencies(index, rows),
+    }
+    statistics.update(score_statistics(priority_scores(cube)))
+    return statistics
+
+
+def score_statistics(scores: pd.DataFrame) -> Dict[str, pd.Series]:
+    return {column.lower(): scores[column] for column in scores.columns}
+
+
+def build_report(df: pd.DataFrame) -> pd.DataFrame:
+    """ Compute the statistics of every filter of the dashboard in one pass
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The preprocessed data (see lib.preprocessing.prepare_data).
+
+    Returns:
+    --------
+
+    report : pandas.core.frame.DataFrame
+        One row per value, with the columns of REPORT_COLUMNS. The year is
+        ALL_YEARS for the statistics of all the years, the teacher is empty for
+        the statistics of every teacher.
+    """
+
+    cube = build_cube(df)
+    index = build_term_index(df['Title'], load_stop_words())
+    year_index = build_year_index(df, cube)
+    profiles = build_teacher_profiles(df, cube, index)
+
+    filters = {(ALL_YEARS, ''): cube_statistics(cube, index, None)}
+    for year in year_index.years:
+        filters[(year, '')] = cube_statistics(year_index.aggregates[year].cube, index, year_index.rows[year])
+    for teacher, year in profiles.rows:
+        profile = teacher_profile(profiles, teacher, year)
+        statistics = {
+            'taken': taken_summary(profile.number_of_topics, profile.number_of_topics_taken),
+            'terms': profile.top_terms[:TOP_TERMS],
+        }
+        statistics.update(score_statistics(profile.scores))
+        filters[(year or ALL_YEARS, teacher)] = statistics
+
+    frames = []
+    for (year, teacher), statistics in filters.items():
+        for statistic, values in statistics.items():
+            frames.append(pd.DataFrame({'Academic-year': year, 'Teacher': teacher, 'statistic': statistic,
+                                        'label': values.index.astype(str), 'value': values.to_numpy(dtype=float)}))
+    return pd.concat(frames, ignore_index=True)[REPORT_COLUMNS]
+
+
+def report_to_dict(report: pd.DataFrame) -> Dict:
+    """ Nest the report as {year: {teacher: {statistic: {label: value}}}} """
+    nested = {}
+    for (year, teacher, statistic), values in report.groupby(['Academic-year', 'Teacher', 'statistic'], sort=False):
+        nested.setdefault(year, {}).setdefault(teacher, {})[statistic] = dict(zip(values['label'], values['value']))
+    return nested
+
+
+def write_report(report: pd.DataFrame, output: str, version: str = '') -> None:
+    """ Write the report as json (nested, see report_to_dict) or parquet (flat), after the extension of output """
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if output.endswith('.parquet'):
+        report.to_parquet(output + '.tmp', index=False)
+    else:
+        with open(output + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'statistics': report_to_dict(report)}, f, ensure_ascii=False)
+    os.replace(output + '.tmp', output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Precompute the statistics of every filter of the dashboard')
+    parser.add_argument('source', help='csv file or dataset store (see lib.ingest)')
+    parser.add_argument('--output', default=os.path.join('reports', 'statistics.json'),
+                        help='report file, .json or .parquet')
+    args = parser.parse_args()
+    report = build_report(prepare_data(args.source))
+    write_report(report, args.output, dataset_version(args.source))
+    print(f'{len(report)} values written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Chart building
+
+Every bar chart of the pages is drawn from an already aggregated Series (one value
+per bar), capped at MAX_BARS bars. The Vega-Lite spec without data is built once
+per kind of chart and cached, each call only swaps the data in; it is attached
+once at the top of the layered chart instead of once per layer.
+
+"""
+import copy
+from functools import lru_cache
+from typing import Dict, Optional
+
+import altair as alt
+import pandas as pd
+
+MAX_BARS = 30
+OTHER_LABEL = 'Other'
+BAR_COLOR = '#4db6ac'
+LABEL = 'label'
+VALUE = 'value'
+
+
+def top_n(values: pd.Series, limit: int = MAX_BARS, other: Optional[str] = OTHER_LABEL) -> pd.Series:
+    """ Keep the largest values, the remaining ones are summed in a single 'other' bar
+
+    Parameters:
+    -----------
+
+    values : pandas.core.series.Series
+        Counts indexed by label.
+    limit : int
+        Maximum number of bars, the 'other' bar included.
+    other : str | None
+        Label of the bar holding the sum of the others, None drops them instead.
+
+    Returns:
+    --------
+
+    values : pandas.core.series.Series
+        At most limit values, largest first (the 'other' bar last).
+    """
+
+    values = values.sort_values(ascending=False, kind='stable')
+    if len(values) <= limit:
+        return values
+    if other is None:
+        return values[:limit]
+    rest = values[limit - 1:]
+    kept = values[:limit - 1]
+    return pd.concat([kept, pd.Series([rest.sum()], index=[f'{other} ({len(rest)})'])])
+
+
+@lru_cache(maxsize=None)
+def bar_spec(value_title: str, label_title: str, width: int = 740, dx: int = 5,
+             with_median: bool = False) -> alt.LayerChart:
+    """ Horizontal bars with their value written next to them, without data
+
+    The charts are cached: build them with bar_chart, which swaps the data in.
+    """
+
+    tooltip = [alt.Tooltip(f'{LABEL}:O', title=label_title), alt.Tooltip(f'{VALUE}:Q', title=value_title)]
+    if with_median:
+        tooltip.append(alt.Tooltip('Median:Q', title='Median priority'))
+    bars = alt.Chart(width=width).mark_bar(color=BAR_COLOR).encode(
+        x=alt.X(f'{VALUE}:Q', axis=alt.Axis(title=value_title)),
+        y=alt.Y(f'{LABEL}:O', axis=alt.Axis(title=label_title), sort='-x'),
+        tooltip=tooltip,
+    )
+    text = bars.mark_text(
+        align='left',
+        baseline='middle',
+        dx=dx  # Nudges text to right so it doesn't appear on top of the bar
+    ).encode(
+        text=f'{VALUE}:Q'
+    )
+    return alt.layer(bars, text)
+
+
+def bar_chart(values: pd.Series, value_title: str, label_title: str, width: int = 740, dx: int = 5,
+              median: Optional[pd.Series] = None) -> alt.LayerChart:
+    """ Bar chart of aggregated values, one bar per label
+
+    Parameters:
+    -----------
+
+    values : pandas.core.series.Series
+        The value of every bar indexed by its label, already capped (see top_n).
+    value_title : str
+        Title of the value axis.
+    label_title : str
+        Title of the label axis.
+    width : int
+    dx : int
+        Space between a bar and its value.
+    median : pandas.core.series.Series | None
+        Median priority of every label, shown in the tooltip.
+
+    Returns:
+    --------
+
+    chart : altair.LayerChart
+    """
+
+    data = bar_data(values, median)
+    spec = bar_spec(value_title, label_title, width, dx, median is not None)
+    return spec.properties(data=data, height=100 + (20 * len(data)))
+
+
+def bar_data(values: pd.Series, median: Optional[pd.Series] = None) -> pd.DataFrame:
+    data = pd.DataFrame({LABEL: values.index.astype(str), VALUE: values.to_numpy()})
+    if median is not None:
+        data['Median'] = median.reindex(values.index).to_numpy()
+    return data
+
+
+@lru_cache(maxsize=None)
+def bar_spec_dict(value_title: str, label_title: str, width: int = 740, dx: int = 5,
+                  with_median: bool = False) -> Dict:
+    """ The Vega-Lite spec of bar_spec, converted once, without its data """
+    empty = pd.Series([], dtype=float)
+    spec = bar_chart(empty, value_title, label_title, width, dx, empty if with_median else None).to_dict()
+    del spec['data'], spec['datasets']
+    return spec
+
+
+def bar_chart_spec(values: pd.Series, value_title: str, label_title: str, width: int = 740, dx: int = 5,
+                   median: Optional[pd.Series] = None) -> Dict:
+    """ The Vega-Lite spec of bar_chart, without building the altair chart
+
+    Altair validates a chart every time its data is swapped in, which takes longer
+    than everything else when many charts are exported (see lib.snapshot).
+    """
+
+    data = bar_data(values, median)
+    spec = copy.deepcopy(bar_spec_dict(value_title, label_title, width, dx, median is not None))
+    spec['data'] = {'values': data.astype(object).where(data.notna(), None).to_dict(orient='records')}
+    spec['height'] = 100 + (20 * len(data))
+    return spec
+
+
+def pie_chart(values: pd.Series, width: int = 400, height: int = 400) -> alt.LayerChart:
+    """ Pie chart of a few values, with their label written next to their slice
+
+    Parameters:
+    -----------
+
+    values : pandas.core.series.Series
+        The value of every slice indexed by its label.
+    width : int
+    height : int
+
+    Returns:
+    --------
+
+    chart : altair.LayerChart
+    """
+
+    source = pd.DataFrame({'category': values.index.astype(str), 'value': values.to_numpy()})
+    base = alt.Chart(source, width=width, height=height).encode(
+        theta=alt.Theta("value:Q", stack=True), color=alt.Color("category:N", legend=None)
+    )
+    pie = base.mark_arc(outerRadius=120)
+    text = base.mark_text(radius=140, size=20).encode(text="category:N")
+    return pie + text
+
+
+@lru_cache(maxsize=None)
+def line_spec(value_title: str, series_title: str, width: int = 740) -> alt.Chart:
+    """ One line per series over the academic years, without data """
+    return alt.Chart(width=width, height=300).mark_line(point=True).encode(
+        x=alt.X('Academic-year:O', axis=alt.Axis(title='Academic year')),
+        y=alt.Y(f'{VALUE}:Q', axis=alt.Axis(title=value_title)),
+        color=alt.Color(f'{LABEL}:N', title=series_title),
+        tooltip=[alt.Tooltip('Academic-year:O'), alt.Tooltip(f'{LABEL}:N', title=series_title),
+                 alt.Tooltip(f'{VALUE}:Q', title=value_title)],
+    )
+
+
+def line_chart(trends: pd.DataFrame, value_title: str, series_title: str, width: int = 740) -> alt.Chart:
+    """ Line chart of aggregated values per year
+
+    Parameters:
+    -----------
+
+    trends : pandas.core.frame.DataFrame
+        One row per series (capped at MAX_BARS) and one column per academic year.
+    value_title : str
+        Title of the value axis.
+    series_title : str
+        Title of the legend.
+    width : int
+
+    Returns:
+    --------
+
+    chart : altair.Chart
+    """
+
+    data = trends[:MAX_BARS].rename_axis(index=LABEL, columns='Academic-year').stack().rename(VALUE).reset_index()
+    data[LABEL] = data[LABEL].astype(str)
+    return line_spec(value_title, series_title, width).properties(data=data)
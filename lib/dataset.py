@@ -0,0 +1,188 @@
+"""Shared dataset
+
+The preprocessed data is loaded once per process and shared by every session
+(see app.load_external_data), so it is frozen: its arrays are read-only and any
+in place modification raises instead of leaking into the other sessions.
+
+Pages never slice the frame itself. They select rows with index arrays (row
+positions, computed on the categorical codes) and only materialize the columns
+they display for those rows. The memory of a session is therefore bounded by its
+largest selection, not by the dataset: session_memory_ceiling gives that bound,
+which the benchmark suite checks against the measured allocations (see
+benchmarks.run.session_memory).
+
+The five priority columns share one speciality code table (see
+lib.preprocessing.share_speciality_codes), so their codes form a compact N x 5
+matrix that counts every (rank, speciality) pair in a single bincount.
+
+"""
+from typing import Dict, Hashable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from lib.preprocessing import PRIORITY_COLUMNS
+
+# Columns a page materializes for the rows it displays (overview and list of topics)
+DISPLAY_COLUMNS = ['Title', 'Grade', 'Taken', 'Priority 1', 'Priority 2', 'Priority 3',
+                   'Priority 4', 'Priority 5', 'Academic-year']
+SELECTION_COLUMNS = ['Teacher', 'Academic-year']
+# The search page scores every topic: float64 scores, then up to one match per topic
+# (int64 positions, float64 negated scores and int64 partition order), plus two boolean masks
+SEARCH_BYTES_PER_TOPIC = 8 + 3 * 8 + 2
+# Selecting rows compares the codes of a column: one boolean per topic
+SELECTION_BYTES_PER_TOPIC = 1
+# Python and pandas objects of a rerun, whatever the size of the data
+RERUN_BYTES = 128 * 1024
+# Code of a priority without speciality
+NO_SPECIALITY = 255
+
+
+def freeze(df: pd.DataFrame) -> pd.DataFrame:
+    """ A frame over the same arrays, read-only, without copying them
+
+    Every column is rebuilt from a read-only view of its values (of its codes for
+    the categorical columns), so pandas writes to these views and raises. The
+    given frame still writes to the arrays: it must be dropped for the new one.
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The frame to share, it must not be used afterwards.
+
+    Returns:
+    --------
+
+    frozen : pandas.core.frame.DataFrame
+        The read-only frame.
+    """
+
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        categorical = isinstance(values.dtype, pd.CategoricalDtype)
+        array = (values.cat.codes if categorical else values).to_numpy().view()
+        array.flags.writeable = False
+        if categorical:
+            array = pd.Categorical.from_codes(array, dtype=values.dtype)
+        columns[column] = pd.Series(array, index=df.index, name=column, copy=False)
+    return pd.DataFrame(columns, copy=False)
+
+
+def row_positions(df: pd.DataFrame, column: str, value: Hashable) -> np.ndarray:
+    """ Positions of the rows where column equals value, compared on the categorical codes """
+    values = df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        if value not in categories:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(values.cat.codes.to_numpy() == categories.get_loc(value))
+    return np.flatnonzero(values.to_numpy() == value)
+
+
+def group_positions(codes: np.ndarray) -> Dict[int, np.ndarray]:
+    """ Ascending row positions of every code, from a single stable sort """
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    return dict(zip(sorted_codes[starts].tolist(), np.split(order, starts[1:])))
+
+
+def take(df: pd.DataFrame, rows: np.ndarray, columns: Sequence[str] = DISPLAY_COLUMNS) -> pd.DataFrame:
+    """ Materialize the given columns of the selected rows (the only copy a page makes) """
+    return df.iloc[rows, df.columns.get_indexer(columns)]
+
+
+def session_memory_ceiling(df: pd.DataFrame, columns: List[str] = DISPLAY_COLUMNS) -> int:
+    """ Upper bound of the memory a page rerun allocates for its selection
+
+    The largest selection a page makes is every topic of a teacher, or every
+    topic of an academic year, found with one boolean per topic
+    (SELECTION_BYTES_PER_TOPIC). The search page also keeps a few dense arrays
+    with one entry per topic (SEARCH_BYTES_PER_TOPIC), and every rerun allocates
+    RERUN_BYTES of small objects. The shared frame and indexes are not counted.
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The shared data.
+    columns : list of str
+        The columns the pages materialize.
+
+    Returns:
+    --------
+
+    number_of_bytes : int
+        Bytes of the row positions and of the materialized columns of the
+        largest selection, plus the arrays of the selection and search pages.
+    """
+
+    ceiling = 0
+    for column in SELECTION_COLUMNS:
+        largest = df[column].value_counts().index[0]
+        rows = row_positions(df, column, largest)
+        ceiling = max(ceiling, rows.nbytes + int(take(df, rows, columns).memory_usage(deep=True).sum()))
+    return ceiling + len(df.index) * (SELECTION_BYTES_PER_TOPIC + SEARCH_BYTES_PER_TOPIC) + RERUN_BYTES
+
+
+class PriorityMatrix(NamedTuple):
+    """ The priority columns as speciality codes
+
+    specialities : pandas.core.indexes.base.Index
+        The speciality of every code, sorted.
+    codes : numpy.ndarray
+        One row per subject and one column per rank, uint8 (NO_SPECIALITY when
+        a rank has no speciality).
+    """
+    specialities: pd.Index
+    codes: np.ndarray
+
+
+def priority_matrix(df: pd.DataFrame) -> PriorityMatrix:
+    """ Speciality codes of the priority columns, which must share their categories """
+    specialities = df[PRIORITY_COLUMNS[0]].cat.categories
+    if len(specialities) >= NO_SPECIALITY:
+        # The codes would wrap around or collide with NO_SPECIALITY
+        raise ValueError(f'{len(specialities)} specialities, the priority codes hold at most {NO_SPECIALITY - 1}')
+    codes = np.empty((len(df.index), len(PRIORITY_COLUMNS)), dtype=np.uint8)
+    for rank, column in enumerate(PRIORITY_COLUMNS):
+        values = df[column]
+        if not values.cat.categories.equals(specialities):
+            raise ValueError(f'{column} does not share the speciality codes of {PRIORITY_COLUMNS[0]}')
+        column_codes = values.cat.codes.to_numpy()
+        codes[:, rank] = np.where(column_codes < 0, NO_SPECIALITY, column_codes)
+    return PriorityMatrix(specialities=specialities, codes=codes)
+
+
+def count_priorities(matrix: PriorityMatrix, groups: Optional[np.ndarray] = None,
+                     number_of_groups: int = 1) -> np.ndarray:
+    """ Number of subjects giving every rank to every speciality, per group of subjects
+
+    Parameters:
+    -----------
+
+    matrix : PriorityMatrix
+    groups : numpy.ndarray | None
+        Group of every subject (0 to number_of_groups - 1, negative to leave it
+        out), None counts all the subjects as one group.
+    number_of_groups : int
+
+    Returns:
+    --------
+
+    counts : numpy.ndarray
+        Of shape (rank, group, speciality), int64.
+    """
+
+    number_of_ranks = matrix.codes.shape[1]
+    number_of_specialities = len(matrix.specialities)
+    if groups is None:
+        groups = np.zeros(len(matrix.codes), dtype=np.int64)
+    groups = np.asarray(groups, dtype=np.int64)
+    keys = np.arange(number_of_ranks, dtype=np.int64) * number_of_groups + groups[:, None]
+    keys = keys * number_of_specialities + matrix.codes
+    kept = (matrix.codes != NO_SPECIALITY) & (groups[:, None] >= 0)
+    counts = np.bincount(keys[kept], minlength=number_of_ranks * number_of_groups * number_of_specialities)
+    return counts.reshape(number_of_ranks, number_of_groups, number_of_specialities)
@@ -0,0 +1,233 @@
+"""Near-duplicate titles
+
+Titles are often proposed again the next year with small edits or typos
+('Eenrichissement'), so every title is given the id of its cluster of
+near-duplicates.
+
+Candidates are found on the character shingles, which typos barely change: their
+Jaccard similarity is estimated with MinHash signatures, and locality-sensitive
+hashing (the signatures split in BANDS bands) only compares titles that agree on
+a whole band, so the cost grows with the number of titles instead of its square.
+
+A candidate pair is then verified on the words: titles one word apart share most
+of their shingles ('CNN for ...' and 'RNN for ...', 'Protocole GPS-based ...'
+and 'Protocole Non-GPS based ...') but are different subjects. Two titles are
+near-duplicates when their content words (stop words left out, negations kept)
+are the same up to typos, with a Jaccard similarity of at least WORD_SIMILARITY.
+
+"""
+from difflib import SequenceMatcher
+from typing import FrozenSet, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+SHINGLE_SIZE = 5
+BANDS = 8
+ROWS_PER_BAND = 4
+NUMBER_OF_HASHES = BANDS * ROWS_PER_BAND
+SIMILARITY = 0.8
+WORD_SIMILARITY = 0.9
+# Two different words are a typo of each other above this similarity ('reseau'/'reseaux')
+TYPO_SIMILARITY = 0.85
+# Stop words that change the meaning of a title
+NEGATIONS = frozenset(['non', 'not', 'no', 'pas', 'sans', 'without'])
+# Titles of a bucket are paired with the next BUCKET_WINDOW ones only, so that a
+# bucket of many identical titles does not yield the square of their number of pairs
+BUCKET_WINDOW = 32
+# Titles are shingled by chunks to bound the memory of the shingle hashes
+CHUNK_SIZE = 50000
+SEED = 0
+_MULTIPLIER = np.uint64(1099511628211)
+
+
+def hash_functions(number_of_hashes: int = NUMBER_OF_HASHES, seed: int = SEED) -> Tuple[np.ndarray, np.ndarray]:
+    """ Odd multipliers and offsets of the multiply-shift hash functions of the signatures """
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, size=number_of_hashes, dtype=np.uint64) | np.uint64(1)
+    offsets = rng.integers(0, 2 ** 63, size=number_of_hashes, dtype=np.uint64)
+    return multipliers, offsets
+
+
+def shingle_hashes(titles: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """ Hash of every character shingle of the titles
+
+    Parameters:
+    -----------
+
+    titles : pandas.core.series.Series
+        Normalized titles (see lib.preprocessing.normalize_text), none of them empty.
+
+    Returns:
+    --------
+
+    hashes : numpy.ndarray
+        uint64 hash of every shingle, title after title.
+    starts : numpy.ndarray
+        Position of the first shingle of every title in hashes.
+    """
+
+    # Titles shorter than a shingle are padded to one shingle
+    titles = titles.str.pad(SHINGLE_SIZE, side='right')
+    lengths = titles.str.len().to_numpy()
+    characters = np.frombuffer(''.join(titles).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+
+    number_of_windows = len(characters) - SHINGLE_SIZE + 1
+    hashes = np.zeros(number_of_windows, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        hashes = hashes * _MULTIPLIER + characters[offset:offset + number_of_windows]
+
+    # Only the windows that start and end in the same title are shingles
+    ends = np.cumsum(lengths)
+    shingles = lengths - SHINGLE_SIZE + 1
+    starts = np.r_[0, np.cumsum(shingles)[:-1]]
+    positions = np.repeat(ends - lengths - starts, shingles) + np.arange(shingles.sum())
+    return hashes[positions], starts
+
+
+def minhash_signatures(titles: pd.Series, number_of_hashes: int = NUMBER_OF_HASHES,
+                       seed: int = SEED) -> np.ndarray:
+    """ MinHash signature of every title
+
+    Parameters:
+    -----------
+
+    titles : pandas.core.series.Series
+        Normalized titles, none of them empty.
+    number_of_hashes : int
+    seed : int
+        Seed of the hash functions, signatures are only comparable with the same seed.
+
+    Returns:
+    --------
+
+    signatures : numpy.ndarray
+        Of shape (titles, number_of_hashes), uint32. The fraction of equal values
+        of two signatures estimates the Jaccard similarity of their shingles.
+    """
+
+    multipliers, offsets = hash_functions(number_of_hashes, seed)
+    signatures = np.empty((len(titles), number_of_hashes), dtype=np.uint32)
+    for start in range(0, len(titles), CHUNK_SIZE):
+        hashes, starts = shingle_hashes(titles.iloc[start:start + CHUNK_SIZE])
+        for column in range(number_of_hashes):
+            values = (hashes * multipliers[column] + offsets[column]) >> np.uint64(32)
+            signatures[start:start + len(starts), column] = np.minimum.reduceat(values, starts)
+    return signatures
+
+
+def candidate_pairs(signatures: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ Pairs of titles that agree on a whole band of their signatures
+
+    Every title is paired with the other titles of its buckets, up to BUCKET_WINDOW
+    of them per bucket; larger buckets are chained, connected_components joins them.
+
+    Returns:
+    --------
+
+    firsts, seconds : numpy.ndarray
+        Title positions of every pair, firsts < seconds, each pair once.
+    """
+
+    firsts, seconds = [], []
+    for band in range(BANDS):
+        values = signatures[:, band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].astype(np.uint64)
+        keys = np.zeros(len(signatures), dtype=np.uint64)
+        for column in range(ROWS_PER_BAND):
+            keys = (keys * _MULTIPLIER) ^ values[:, column]
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        for distance in range(1, min(BUCKET_WINDOW, len(order) - 1) + 1):
+            same = sorted_keys[distance:] == sorted_keys[:-distance]
+            if not same.any():
+                break
+            firsts.append(order[:-distance][same])
+            seconds.append(order[distance:][same])
+    if not firsts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    firsts, seconds = np.concatenate(firsts), np.concatenate(seconds)
+    pairs = np.unique(np.minimum(firsts, seconds) * len(signatures) + np.maximum(firsts, seconds))
+    return pairs // len(signatures), pairs % len(signatures)
+
+
+def content_words(title: str, stop_words: FrozenSet[str]) -> FrozenSet[str]:
+    """ Words of a title that are not stop words (negations are kept), all of them if none is left """
+    words = frozenset(title.split())
+    content = frozenset(word for word in words
+                        if (word not in stop_words and len(word) > 1) or word in NEGATIONS)
+    return content or words
+
+
+def word_similarity(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    """ Jaccard similarity of two sets of words, a word matching its typo in the other set """
+    common = len(first & second)
+    rest = list(second - first)
+    for word in first - second:
+        for position, other in enumerate(rest):
+            if SequenceMatcher(None, word, other).ratio() >= TYPO_SIMILARITY:
+                common += 1
+                del rest[position]
+                break
+    return common / (len(first) + len(second) - common)
+
+
+def connected_components(number_of_titles: int, firsts: np.ndarray, seconds: np.ndarray) -> np.ndarray:
+    """ Smallest title position of the component of every title, by label propagation """
+    labels = np.arange(number_of_titles)
+    while True:
+        updated = labels.copy()
+        np.minimum.at(updated, firsts, labels[seconds])
+        np.minimum.at(updated, seconds, labels[firsts])
+        # Jump to the label of the label until it stops changing
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def near_duplicate_clusters(titles: pd.Series, stop_words: Iterable[str] = (),
+                            similarity: float = SIMILARITY) -> np.ndarray:
+    """ Cluster id of every title, shared by its near-duplicates
+
+    Parameters:
+    -----------
+
+    titles : pandas.core.series.Series
+        Normalized titles (see lib.preprocessing.normalize_text), in the row order of the data.
+    stop_words : iterable of str
+        Words left out of the verification of the pairs, normalized like the titles.
+    similarity : float
+        Minimum estimated Jaccard similarity of the shingles of two candidates.
+
+    Returns:
+    --------
+
+    clusters : numpy.ndarray
+        int32, the row position of the first title of the cluster. Titles without
+        any word are left alone in their cluster.
+    """
+
+    clusters = np.arange(len(titles), dtype=np.int32)
+    titles = titles.fillna('').str.replace(r'\W+', ' ', regex=True).str.strip()
+    rows = np.flatnonzero(titles.str.len().to_numpy() > 0)
+    if len(rows) < 2:
+        return clusters
+
+    titles = titles.iloc[rows].to_numpy()
+    signatures = minhash_signatures(pd.Series(titles))
+    firsts, seconds = candidate_pairs(signatures)
+    candidates = (signatures[firsts] == signatures[seconds]).mean(axis=1) >= similarity
+    firsts, seconds = firsts[candidates], seconds[candidates]
+
+    stop_words = frozenset(stop_words)
+    words = {position: content_words(titles[position], stop_words) for position in np.union1d(firsts, seconds)}
+    verified = np.array([titles[first] == titles[second]
+                         or word_similarity(words[first], words[second]) >= WORD_SIMILARITY
+                         for first, second in zip(firsts, seconds)], dtype=bool)
+    labels = connected_components(len(rows), firsts[verified], seconds[verified])
+    clusters[rows] = rows[labels]
+    return clusters
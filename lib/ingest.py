@@ -0,0 +1,245 @@
+"""Ingestion script
+
+This script adds the topics of a new season to the partitioned dataset store
+
+The store is a directory of parquet files with one sub directory per academic
+year ('Academic-year=2022-2023'). New topics are written as new files, so adding
+a year costs O(new rows); only the years holding topics that were scraped again
+(same Id) are rewritten, in a hidden directory swapped in place of the partition.
+It accepts both the output of lib.web_scrapping and csv files that already follow
+the analysis schema (dataset/subjects_master.csv).
+
+Only the ingestion is incremental: the app preprocesses the whole store again
+(once, see lib.preprocessing.prepare_data) when its files change.
+
+Usage: python -m lib.ingest subjects_master_2023_2.csv --store dataset/subjects
+
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import uuid
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+STORE_PATH = os.path.join('dataset', 'subjects')
+PARTITION_COLUMN = 'Academic-year'
+# Topics are proposed from September for the academic year that starts then
+ACADEMIC_YEAR_START_MONTH = 9
+# Dates of the scraped pages are written day first ('03/10/2022')
+DATE_FORMAT = '%d/%m/%Y'
+# Directories starting with these are not read (pyarrow ignores them as well)
+IGNORED_PREFIXES = ('.', '_')
+# Suffix of the staging directory of a partition swap, given to the partition it replaces
+RETIRED_SUFFIX = '.old'
+SCRAPER_COLUMNS = {'Author': 'Teacher'}
+SCHEMA = pa.schema([
+    ('Id', pa.string()),
+    ('Title', pa.string()),
+    ('Teacher', pa.string()),
+    ('Grade', pa.string()),
+    ('Taken', pa.bool_()),
+    ('Priority 1', pa.string()),
+    ('Priority 2', pa.string()),
+    ('Priority 3', pa.string()),
+    ('Priority 4', pa.string()),
+    ('Priority 5', pa.string()),
+])
+PARTITIONING = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor='hive')
+
+
+def academic_year(dates: pd.Series) -> pd.Series:
+    """ '03/10/2022' -> '2022-2023', '14/02/2023' -> '2022-2023' """
+    dates = pd.to_datetime(dates, format=DATE_FORMAT)
+    start = dates.dt.year - (dates.dt.month < ACADEMIC_YEAR_START_MONTH)
+    return start.astype(str) + '-' + (start + 1).astype(str)
+
+
+def to_analysis_schema(raw: pd.DataFrame) -> pd.DataFrame:
+    """ Map the rows of the scraper (or of the analysis csv) onto the store schema
+
+    Parameters:
+    -----------
+
+    raw : pandas.core.frame.DataFrame
+        Topics with the columns of lib.web_scrapping.COLUMNS, or of the analysis
+        dataset (Title, Teacher, Grade, Taken, Priority 1-5, Academic-year).
+
+    Returns:
+    --------
+
+    df : pandas.core.frame.DataFrame
+        The topics with the columns of SCHEMA plus Academic-year. Rows without an
+        Id get one derived from their year, teacher, title and occurrence.
+    """
+
+    df = raw.rename(columns=SCRAPER_COLUMNS)
+    if PARTITION_COLUMN not in df.columns:
+        df[PARTITION_COLUMN] = academic_year(df['Date'])
+    if 'Id' not in df.columns:
+        keys = df[PARTITION_COLUMN] + '|' + df['Teacher'] + '|' + df['Title']
+        # A topic proposed twice keeps both rows, re-ingesting the same file still maps onto the same Ids
+        keys = keys + '|' + keys.groupby(keys).cumcount().astype(str)
+        df['Id'] = keys.map(lambda key: 'sha1-' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+    df['Id'] = df['Id'].astype(str)
+    df['Taken'] = df['Taken'].astype(bool)
+    return df[SCHEMA.names + [PARTITION_COLUMN]]
+
+
+def open_store(store: str) -> ds.Dataset:
+    """ The store as a lazily scanned pyarrow dataset """
+    return ds.dataset(store, format='parquet', schema=SCHEMA.append(pa.field(PARTITION_COLUMN, pa.string())),
+                      partitioning=PARTITIONING)
+
+
+def read_store(store: str) -> pd.DataFrame:
+    """ Read every partition of the store, in the column order of the analysis csv """
+    recover_store(store, cleanup=False)
+    df = open_store(store).to_table().to_pandas()
+    columns = [column for column in SCHEMA.names if column != 'Id'] + [PARTITION_COLUMN, 'Id']
+    return df[columns]
+
+
+def store_files(store: str) -> List[str]:
+    """ Relative paths of the parquet files of the store, sorted """
+    files = []
+    for directory, directories, file_names in os.walk(store):
+        # Partitions being rewritten are staged in hidden directories
+        directories[:] = [name for name in directories if not name.startswith(IGNORED_PREFIXES)]
+        files += [os.path.relpath(os.path.join(directory, file_name), store)
+                  for file_name in file_names if file_name.endswith('.parquet')]
+    return sorted(files)
+
+
+def partition_directory(store: str, year: str) -> str:
+    return os.path.join(store, f'{PARTITION_COLUMN}={year}')
+
+
+def write_partition(store: str, year: str, df: pd.DataFrame, directory: Optional[str] = None) -> str:
+    """ Write topics of one academic year as a new file of its partition (or of directory) """
+    directory = directory or partition_directory(store, year)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'part-{uuid.uuid4().hex}.parquet')
+    table = pa.Table.from_pandas(df[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+    pq.write_table(table, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def replace_partition(store: str, year: str, df: pd.DataFrame) -> None:
+    """ Replace every topic of one academic year
+
+    The new partition is written in a hidden directory, then swapped with the
+    current one (renamed to the staging directory + RETIRED_SUFFIX first): never
+    a truncated file or the rows of both. A crash between the two renames leaves
+    the year in hidden directories only, recover_store (run by ingest and
+    read_store) swaps the new partition in then.
+    """
+
+    directory = partition_directory(store, year)
+    staging = os.path.join(store, f'.{PARTITION_COLUMN}={year}.{uuid.uuid4().hex}')
+    retired = staging + RETIRED_SUFFIX
+    if len(df):
+        write_partition(store, year, df, staging)
+    else:
+        os.makedirs(staging)
+    os.replace(directory, retired)
+    os.replace(staging, directory)
+    shutil.rmtree(retired)
+
+
+def recover_store(store: str, cleanup: bool = True) -> None:
+    """ Finish the partition swaps a crash interrupted (see replace_partition)
+
+    A year whose partition was retired but not replaced gets its staging
+    directory, which was complete before the swap started (or its retired
+    partition back if the staging directory is gone).
+
+    Parameters:
+    -----------
+
+    store : str
+        Directory of the partitioned dataset store.
+    cleanup : bool
+        Also remove the retired partitions and the staging directories of the
+        swaps that never started. Only the writer (ingest) does it, a reader
+        would remove the files of a swap in progress.
+    """
+
+    if not os.path.isdir(store):
+        return
+    hidden = [name for name in os.listdir(store) if name.startswith(f'.{PARTITION_COLUMN}=')]
+    for name in hidden:
+        if not name.endswith(RETIRED_SUFFIX):
+            continue
+        retired = os.path.join(store, name)
+        staging = retired[:-len(RETIRED_SUFFIX)]
+        # '.Academic-year=2022-2023.<uuid>.old' -> 'Academic-year=2022-2023'
+        directory = os.path.join(store, name[1:-len(RETIRED_SUFFIX)].rsplit('.', 1)[0])
+        if not os.path.exists(directory):
+            os.replace(staging if os.path.exists(staging) else retired, directory)
+        if cleanup and os.path.exists(retired):
+            shutil.rmtree(retired)
+    if cleanup:
+        for name in hidden:
+            path = os.path.join(store, name)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+
+
+def ingest(source: str, store: str = STORE_PATH) -> Dict[str, int]:
+    """ Add the topics of a csv file to the store, deduplicated on their Id
+
+    Parameters:
+    -----------
+
+    source : str
+        Path of the csv file (scraper output or analysis schema).
+    store : str
+        Directory of the partitioned dataset store, created if needed.
+
+    Returns:
+    --------
+
+    dictionary in the form 'academic_year:number_of_topics_written'
+    """
+
+    df = to_analysis_schema(pd.read_csv(source))
+    recover_store(store)
+    # The scraper appends pages again when they change, the last rows are the current ones
+    df = df.drop_duplicates('Id', keep='last')
+
+    updated_years = set()
+    if store_files(store):
+        # Only the Id column and the partition keys are read to find the topics seen before
+        existing = open_store(store).to_table(columns=['Id', PARTITION_COLUMN]).to_pandas()
+        updated_years = set(existing.loc[existing['Id'].isin(df['Id']), PARTITION_COLUMN].unique())
+        for year in updated_years:
+            partition = open_store(store).to_table(filter=ds.field(PARTITION_COLUMN) == year).to_pandas()
+            kept = partition[~partition['Id'].isin(df['Id'])]
+            replace_partition(store, year, pd.concat([kept, df[df[PARTITION_COLUMN] == year]], ignore_index=True))
+
+    written = {}
+    for year, topics in df.groupby(PARTITION_COLUMN):
+        if year not in updated_years:
+            write_partition(store, year, topics)
+        written[year] = len(topics)
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Add topics to the partitioned dataset store')
+    parser.add_argument('source', help='csv file written by lib.web_scrapping (or in the analysis schema)')
+    parser.add_argument('--store', default=STORE_PATH, help='directory of the dataset store')
+    args = parser.parse_args()
+    for year, number_of_topics in ingest(args.source, args.store).items():
+        print(f'{year}: {number_of_topics} topics')
+
+
+if __name__ == '__main__':
+    main()
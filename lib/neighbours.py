@@ -0,0 +1,63 @@
+"""Nearest neighbours
+
+Cosine similarity top-k of every row of a matrix against all the others. The
+similarity matrix is never held whole: rows are compared by blocks of
+BLOCK_SIZE, so the memory grows with the number of rows times the block size.
+
+"""
+from typing import Tuple
+
+import numpy as np
+
+BLOCK_SIZE = 1024
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """ Scale the rows to unit length, rows of zeros are left as they are """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def cosine_top_k(vectors: np.ndarray, k: int, block_size: int = BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """ The k most similar rows of every row, itself left out
+
+    Parameters:
+    -----------
+
+    vectors : numpy.ndarray
+        One row per item.
+    k : int
+        Number of neighbours, at most the number of rows minus one.
+    block_size : int
+        Number of rows compared at once.
+
+    Returns:
+    --------
+
+    indices : numpy.ndarray
+        Of shape (rows, k), the neighbours of every row, most similar first. Rows
+        of zeros have no similarity with anything, their neighbours are -1.
+    similarities : numpy.ndarray
+        Of shape (rows, k), float32 cosine similarity of every neighbour.
+    """
+
+    number_of_rows = len(vectors)
+    k = max(min(k, number_of_rows - 1), 0)
+    unit = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    indices = np.full((number_of_rows, k), -1, dtype=np.int64)
+    similarities = np.zeros((number_of_rows, k), dtype=np.float32)
+    if k == 0:
+        return indices, similarities
+
+    for start in range(0, number_of_rows, block_size):
+        block = unit[start:start + block_size] @ unit.T
+        # A row is not its own neighbour
+        block[np.arange(len(block)), np.arange(start, start + len(block))] = -np.inf
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')
+        top, scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(scores, order, axis=1)
+        found = scores > 0
+        indices[start:start + len(block)] = np.where(found, top, -1)
+        similarities[start:start + len(block)] = np.where(found, scores, 0)
+    return indices, similarities
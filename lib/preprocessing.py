@@ -1,14 +1,49 @@
+import functools
+import hashlib
+import json
+import os
+import zipfile
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
 import pandas as pd
-import regex as re
+import pyarrow.feather as feather
+
+from lib.dedup import near_duplicate_clusters
+from lib.ingest import read_store, store_files
+
+CACHE_DIR = '.cache'
+# Bump whenever preprocess() changes the shape or content of its output,
+# so that stale artifacts built by older code are rebuilt.
+CACHE_VERSION = 6
+PRIORITY_COLUMNS = ['Priority 1', 'Priority 2', 'Priority 3', 'Priority 4', 'Priority 5']
+CATEGORICAL_COLUMNS = ['Teacher', 'Grade'] + PRIORITY_COLUMNS + ['Academic-year']
+DERIVED_COLUMNS = ['GradeBase', 'Department', 'IsExternal']
+TOKEN_PATTERN = r'\w+'
+COMBINING_MARKS = '[\u0300-\u036f]'
+MIN_BIGRAM_SUBJECTS = 2
+# French and English stop word lists of the NLTK stopwords corpus, shipped with
+# the app so that nothing has to be downloaded at startup
+STOP_WORDS_DIR = os.path.join(os.path.dirname(__file__), 'resources', 'stopwords')
+STOP_WORDS_LANGUAGES = ('french', 'english')
 
-def prepare_data(path: str) -> pd.DataFrame:
+
+def prepare_data(path: str, use_cache: bool = True) -> pd.DataFrame:
     """ Load and prepare/preprocess the data
 
+    The first load parses the csv and stores the preprocessed data as a
+    typed columnar (feather) artifact next to it, later loads read that
+    artifact instead as long as the csv did not change: the parsing and the
+    preprocessing are skipped, the columns are still copied into pandas.
+
     Parameters:
     -----------
 
     path : str
-        Path to the dataset, file should be in csv format.
+        Path to the dataset, either a csv file or the directory of the
+        partitioned dataset store (see lib.ingest).
+    use_cache : bool
+        Read/write the columnar artifact, if False always parse the csv.
 
     Returns:
     --------
@@ -17,10 +52,444 @@ def prepare_data(path: str) -> pd.DataFrame:
         The preprocessed data to be used for the analyses of thesis subjects.
     """
 
-    df = pd.read_csv(path)
-    df['Grade'] = df['Grade'].apply(fix_faculty_typing)
+    if not use_cache:
+        return preprocess(read_source(path))
+
+    cache_path, manifest_path = get_cache_paths(path)
+    manifest = read_manifest(manifest_path)
+    fingerprint = source_fingerprint(path, manifest)
+    fresh = all(manifest.get(key) == fingerprint[key] for key in ('version', 'sha256'))
+    if fresh and os.path.exists(cache_path):
+        df = feather.read_feather(cache_path)
+    else:
+        df = preprocess(read_source(path))
+    try:
+        if not fresh or not os.path.exists(cache_path):
+            write_cache(df, cache_path)
+        if fingerprint != manifest:
+            write_manifest(manifest_path, fingerprint)
+    except OSError:
+        # Read-only deployments still work, they just parse the csv every time
+        pass
+    return df
+
+
+def read_source(path: str) -> pd.DataFrame:
+    """ Read the raw data from a csv file or from the partitioned dataset store """
+    if os.path.isdir(path):
+        return read_store(path)
+    return pd.read_csv(path)
+
+
+def preprocess(df: pd.DataFrame) -> pd.DataFrame:
+    """ Clean the raw csv data and give the columns compact dtypes
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The data as read from the csv file.
+
+    Returns:
+    --------
+
+    df : pandas.core.frame.DataFrame
+        The preprocessed data.
+    """
+
+    df['Taken'] = df['Taken'].astype(bool)
+    for column in CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype('category')
+    df = share_speciality_codes(df)
+    df = add_grade_columns(df)
+    # Near-duplicate titles share the id of their cluster (see lib.dedup)
+    df['Cluster'] = near_duplicate_clusters(normalize_text(df['Title'].fillna('')), normalized_stop_words())
+    return df
+
+
+def share_speciality_codes(df: pd.DataFrame) -> pd.DataFrame:
+    """ Give the priority columns one speciality code table, sorted, so that a
+    speciality has the same code whatever its rank (see lib.dataset.priority_matrix) """
+    specialities = sorted(set().union(*(df[column].cat.categories for column in PRIORITY_COLUMNS)))
+    for column in PRIORITY_COLUMNS:
+        df[column] = df[column].cat.set_categories(specialities)
+    return df
+
+
+def add_grade_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """ Normalize the Grade column and derive the columns parsed out of it
+
+    A raw grade looks like 'Maitre de conferences classe B) --> Hors département: Faculté de technologie'
+    for teachers from other departments and like 'Professeur' otherwise. The string operations run once
+    per distinct grade and the results are mapped back onto the rows through the categorical codes.
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The data with a categorical Grade column.
+
+    Returns:
+    --------
+
+    df : pandas.core.frame.DataFrame
+        The data with a cleaned Grade column and the added columns:
+        - GradeBase: the grade without the department part
+        - Department: the department of external teachers (missing for our department)
+        - IsExternal: True if the teacher is from another department
+    """
+
+    levels = df['Grade'].cat.categories.to_series()
+    fixed = fix_faculty_typing(levels)
+    is_external = fixed.str.contains('Hors', regex=False)
+    grade_base = fixed.str.split(')', n=1).str[0].str.strip()
+    department = fixed.str.partition(':')[2].str.replace(':', '', regex=False).str.strip()
+    department = department.where(is_external)
+
+    df['Grade'] = df['Grade'].map(fixed).astype('category')
+    df['GradeBase'] = df['Grade'].map(dict(zip(fixed, grade_base))).astype('category')
+    df['Department'] = df['Grade'].map(dict(zip(fixed, department))).astype('category')
+    df['IsExternal'] = df['Grade'].map(dict(zip(fixed, is_external))).astype(bool)
     return df
 
 
-def fix_faculty_typing(string: str) -> str:
-    return re.sub('Faculte','Faculté',string)
+def fix_faculty_typing(grades: pd.Series) -> pd.Series:
+    return grades.str.replace('Faculte', 'Faculté', regex=False)
+
+
+def get_cache_paths(path: str) -> Tuple[str, str]:
+    """ Paths of the columnar artifact and its manifest for a csv file or a store """
+    directory, file_name = os.path.split(os.path.normpath(path))
+    name = os.path.splitext(file_name)[0]
+    cache_dir = os.path.join(directory, CACHE_DIR)
+    return os.path.join(cache_dir, name + '.feather'), os.path.join(cache_dir, name + '.json')
+
+
+def read_manifest(manifest_path: str) -> Dict:
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(manifest_path: str, fingerprint: Dict) -> None:
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(fingerprint, f)
+
+
+def read_arrays(array_path: str, format_version: int) -> Tuple[Optional[Dict[str, np.ndarray]], str]:
+    """ The arrays of a derived cache file (.npz) and the dataset version they were computed for
+
+    A missing or unreadable file, or one written in another format, is a cache miss
+    (None): it is computed again and overwritten. Nothing is unpickled.
+    """
+
+    try:
+        with np.load(array_path, allow_pickle=False) as stored:
+            arrays = {name: stored[name] for name in stored.files}
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+        return None, ''
+    if 'format' not in arrays or int(arrays.pop('format')) != format_version:
+        return None, ''
+    return arrays, str(arrays.pop('version', ''))
+
+
+def write_arrays(array_path: str, arrays: Dict[str, Any], version: str, format_version: int) -> None:
+    """ Store arrays as a derived cache file (.npz), text as unicode arrays, atomically """
+    arrays = {name: np.asarray(value) for name, value in arrays.items()}
+    arrays = {name: value.astype(str) if value.dtype == object else value for name, value in arrays.items()}
+    os.makedirs(os.path.dirname(array_path) or '.', exist_ok=True)
+    with open(array_path + '.tmp', 'wb') as f:
+        np.savez(f, format=format_version, version=version, **arrays)
+    os.replace(array_path + '.tmp', array_path)
+
+
+def source_fingerprint(path: str, manifest: Dict) -> Dict:
+    """ Describe the current state of the source file
+
+    The content hash is only computed when the size or modification time
+    differ from the manifest, so an unchanged file costs a single stat call.
+    The files of a dataset store are never modified, only added or removed,
+    so a store is hashed on the listing of its files instead of their content.
+
+    Parameters:
+    -----------
+
+    path : str
+        Path to the source csv file or dataset store.
+    manifest : dict
+        Fingerprint stored when the artifact was last built (may be empty).
+
+    Returns:
+    --------
+
+    dictionary with the keys 'version', 'size', 'mtime' and 'sha256'
+    """
+
+    if os.path.isdir(path):
+        listing = [(name, os.path.getsize(os.path.join(path, name))) for name in store_files(path)]
+        return {'version': CACHE_VERSION, 'size': sum(size for _, size in listing), 'mtime': None,
+                'sha256': hashlib.sha256(json.dumps(listing).encode('utf-8')).hexdigest()}
+
+    stat = os.stat(path)
+    fingerprint = {'version': CACHE_VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    if manifest and all(manifest.get(key) == value for key, value in fingerprint.items()):
+        fingerprint['sha256'] = manifest.get('sha256')
+        return fingerprint
+
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    fingerprint['sha256'] = sha256.hexdigest()
+    return fingerprint
+
+
+def dataset_version(path: str) -> str:
+    """ Token that changes whenever the data at path changes
+
+    Cheap enough to be computed on every rerun (a stat call and the manifest
+    read for a csv, a directory listing for a store), it is used as cache key
+    instead of hashing the data itself.
+
+    Parameters:
+    -----------
+
+    path : str
+        Path to the source csv file or dataset store.
+
+    Returns:
+    --------
+
+    version : str
+        Content hash of the source.
+    """
+
+    return source_fingerprint(path, read_manifest(get_cache_paths(path)[1]))['sha256']
+
+
+def write_cache(df: pd.DataFrame, cache_path: str) -> None:
+    """ Atomically write the preprocessed data as an uncompressed feather file
+
+    Uncompressed so that reading it back costs no decompression, only the
+    conversion of the columns to pandas.
+    """
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + '.tmp'
+    feather.write_feather(df.reset_index(drop=True), tmp_path, compression='uncompressed')
+    os.replace(tmp_path, cache_path)
+
+
+class TermIndex(NamedTuple):
+    """ Document-term matrix of the subject titles and its inverted index
+
+    Both are stored as compressed sparse arrays: the terms of subject i are
+    terms[indptr[i]:indptr[i + 1]] and the subjects containing term t are
+    postings[postings_ptr[t]:postings_ptr[t + 1]].
+
+    indptr, terms, counts : numpy.ndarray
+        The document-term matrix (one row per subject, in the row order of the data).
+    postings_ptr, postings, postings_counts : numpy.ndarray
+        The inverted index (one row per term).
+    vocabulary : pandas.core.indexes.base.Index
+        Normalized form of each term ('deep learning', 'systemes', ...).
+    labels : pandas.core.indexes.base.Index
+        Display form of each term, its most frequent spelling ('Deep Learning', 'systèmes', ...).
+    parts : numpy.ndarray
+        For bigrams, the codes of their two words, -1 for single words.
+    """
+    indptr: np.ndarray
+    terms: np.ndarray
+    counts: np.ndarray
+    postings_ptr: np.ndarray
+    postings: np.ndarray
+    postings_counts: np.ndarray
+    vocabulary: pd.Index
+    labels: pd.Index
+    parts: np.ndarray
+
+
+@functools.lru_cache(maxsize=None)
+def load_stop_words(languages: Tuple[str, ...] = STOP_WORDS_LANGUAGES) -> frozenset:
+    """ Read the bundled stop word lists (one word per line) once per process
+
+    Parameters:
+    -----------
+
+    languages : tuple of str
+        Names of the lists in lib/resources/stopwords.
+
+    Returns:
+    --------
+
+    stop_words : frozenset of str
+    """
+
+    stop_words = set()
+    for language in languages:
+        with open(os.path.join(STOP_WORDS_DIR, language + '.txt'), 'r', encoding='utf-8') as f:
+            stop_words.update(line.strip() for line in f if line.strip())
+    return frozenset(stop_words)
+
+
+@functools.lru_cache(maxsize=None)
+def normalized_stop_words(languages: Tuple[str, ...] = STOP_WORDS_LANGUAGES) -> frozenset:
+    """ The bundled stop words, normalized like the titles (see normalize_text) """
+    return frozenset(normalize_text(pd.Series(sorted(load_stop_words(languages)), dtype=object)))
+
+
+def normalize_text(text: pd.Series) -> pd.Series:
+    """ Lower case and fold the accents away ('Systèmes' -> 'systemes') """
+    folded = text.str.lower().str.normalize('NFKD').str.replace(COMBINING_MARKS, '', regex=True)
+    return folded.str.normalize('NFC')
+
+
+def tokenize(titles: pd.Series, stop_words: Iterable[str]) -> pd.DataFrame:
+    """ Split the titles into words, punctuation is dropped
+
+    Parameters:
+    -----------
+
+    titles : pandas.core.series.Series
+        The subject titles, in the row order of the data.
+    stop_words : iterable of str
+        Words to leave out, compared after normalization.
+
+    Returns:
+    --------
+
+    tokens : pandas.core.frame.DataFrame
+        One row per word in reading order, with the columns 'subject' (row position),
+        'token' (as written), 'key' (normalized) and 'stop' (True for stop words,
+        numbers and single characters, which are kept to know which words are adjacent).
+    """
+
+    tokens = titles.reset_index(drop=True).str.normalize('NFC').str.findall(TOKEN_PATTERN).explode().dropna()
+    keys = normalize_text(tokens)
+    stop_words = set(normalize_text(pd.Series(list(stop_words), dtype=object)))
+    stop = keys.isin(stop_words) | tokens.str.isdigit() | (keys.str.len() < 2)
+    return pd.DataFrame({'subject': tokens.index.to_numpy(), 'token': tokens.to_numpy(),
+                         'key': keys.to_numpy(), 'stop': stop.to_numpy()})
+
+
+def build_term_index(titles: pd.Series, stop_words: Iterable[str]) -> TermIndex:
+    """ Tokenize the titles once into a document-term matrix and an inverted index
+
+    The terms are the normalized words that are not stop words, plus the bigrams
+    of adjacent words ('deep learning') found in at least MIN_BIGRAM_SUBJECTS subjects.
+
+    Parameters:
+    -----------
+
+    titles : pandas.core.series.Series
+        The subject titles, in the row order of the data.
+    stop_words : iterable of str
+        Words to leave out of the terms.
+
+    Returns:
+    --------
+
+    index : TermIndex
+    """
+
+    tokens = tokenize(titles, stop_words)
+    following = tokens.shift(-1)
+    is_bigram = (~tokens['stop'] & ~following['stop'].fillna(True).astype(bool)
+                 & (tokens['subject'] == following['subject']))
+    bigrams = pd.DataFrame({'subject': tokens['subject'][is_bigram],
+                            'key': tokens['key'][is_bigram] + ' ' + following['key'][is_bigram],
+                            'first': tokens['key'][is_bigram], 'second': following['key'][is_bigram],
+                            'token': tokens['token'][is_bigram] + ' ' + following['token'][is_bigram]})
+    subjects_per_bigram = bigrams.drop_duplicates(['subject', 'key'])['key'].value_counts()
+    bigrams = bigrams[bigrams['key'].map(subjects_per_bigram) >= MIN_BIGRAM_SUBJECTS]
+
+    words = tokens[~tokens['stop']]
+    entries = pd.concat([words[['subject', 'key', 'token']], bigrams[['subject', 'key', 'token']]],
+                        ignore_index=True)
+    codes, vocabulary = pd.factorize(entries['key'])
+    # Display every term with its most frequent spelling, e.g. 'IoT' rather than 'iot'
+    labels = entries.groupby(['key', 'token']).size().sort_values(ascending=False).reset_index()
+    labels = labels.drop_duplicates('key').set_index('key')['token'].reindex(vocabulary)
+
+    parts = np.full((len(vocabulary), 2), -1)
+    bigram_keys = bigrams.drop_duplicates('key')
+    parts[vocabulary.get_indexer(bigram_keys['key'])] = np.column_stack(
+        [vocabulary.get_indexer(bigram_keys['first']), vocabulary.get_indexer(bigram_keys['second'])])
+
+    counts = pd.DataFrame({'subject': entries['subject'], 'term': codes}).value_counts().sort_index()
+    subjects = counts.index.get_level_values('subject').to_numpy()
+    terms = counts.index.get_level_values('term').to_numpy()
+    counts = counts.to_numpy()
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(subjects, minlength=len(titles)))])
+
+    order = np.argsort(terms, kind='stable')
+    postings_ptr = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(vocabulary)))])
+
+    return TermIndex(indptr=indptr, terms=terms, counts=counts,
+                     postings_ptr=postings_ptr, postings=subjects[order], postings_counts=counts[order],
+                     vocabulary=pd.Index(vocabulary), labels=pd.Index(labels.to_numpy()), parts=parts)
+
+
+def select_entries(indptr: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """ Positions of the entries of some rows of a compressed sparse array """
+    starts, ends = indptr[rows], indptr[np.asarray(rows) + 1]
+    lengths = ends - starts
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return np.arange(lengths.sum()) + offsets
+
+
+def term_frequencies(index: TermIndex, rows: Optional[np.ndarray] = None) -> pd.Series:
+    """ Sum the term counts of some subjects
+
+    Parameters:
+    -----------
+
+    index : TermIndex
+    rows : numpy.ndarray | None
+        Row positions of the subjects to count, None means all of them.
+
+    Returns:
+    --------
+
+    frequencies : pandas.core.series.Series
+        Number of occurrences indexed by term code, terms that do not occur are left out.
+    """
+
+    terms, counts = index.terms, index.counts
+    if rows is not None:
+        entries = select_entries(index.indptr, rows)
+        terms, counts = terms[entries], counts[entries]
+    frequencies = np.bincount(terms, weights=counts, minlength=len(index.vocabulary))
+    frequencies = pd.Series(frequencies.astype(int))
+    return frequencies[frequencies > 0]
+
+
+def cloud_frequencies(index: TermIndex, rows: Optional[np.ndarray] = None) -> pd.Series:
+    """ Term frequencies to draw for some subjects
+
+    Like WordCloud's collocations, the occurrences of a bigram ('Deep Learning')
+    are taken away from its two words so that they are not shown three times.
+
+    Parameters:
+    -----------
+
+    index : TermIndex
+    rows : numpy.ndarray | None
+        Row positions of the subjects, None means all of them.
+
+    Returns:
+    --------
+
+    frequencies : pandas.core.series.Series
+        Number of occurrences by term (display form).
+    """
+
+    frequencies = np.zeros(len(index.vocabulary), dtype=int)
+    counts = term_frequencies(index, rows)
+    frequencies[counts.index] = counts
+    bigrams = np.flatnonzero((index.parts[:, 0] >= 0) & (frequencies > 0))
+    for part in (0, 1):
+        np.subtract.at(frequencies, index.parts[bigrams, part], frequencies[bigrams])
+    kept = frequencies > 0
+    return pd.Series(frequencies[kept], index=index.labels[kept])
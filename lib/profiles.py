@@ -0,0 +1,151 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from lib.aggregation import Cube
+from lib.dataset import group_positions
+from lib.preprocessing import TermIndex, cloud_frequencies
+from lib.scoring import RANKS, histogram_scores
+
+# WordCloud draws at most max_words=200 words, the others never need to be kept
+TOP_TERMS = 200
+
+
+class TeacherProfile(NamedTuple):
+    """ Everything the Teacher Statistics page shows for a teacher and a year
+
+    rows : numpy.ndarray
+        Row positions of the teacher's subjects, ascending.
+    grade : str
+        Grade of the teacher on the first of these subjects.
+    number_of_topics : int
+    number_of_topics_taken : int
+    scores : pandas.core.frame.DataFrame
+        Rank statistics of the specialities (see lib.scoring.speciality_scores).
+    top_terms : pandas.core.series.Series
+        The most frequent terms of the titles (see lib.preprocessing.cloud_frequencies).
+    """
+    rows: np.ndarray
+    grade: str
+    number_of_topics: int
+    number_of_topics_taken: int
+    scores: pd.DataFrame
+    top_terms: pd.Series
+
+
+ProfileKey = Tuple[str, Optional[str]]
+
+
+class TeacherProfiles(NamedTuple):
+    """ Profiles of every teacher, indexed once at load time and built on first lookup
+
+    teachers : list of str
+        Names of the teachers, sorted.
+    rows : dict
+        Row positions of the subjects by (teacher, academic year), the year None
+        standing for every year. Teachers without subjects in a year have no key for it.
+    df : pandas.core.frame.DataFrame
+        The preprocessed data the rows point to.
+    index : TermIndex
+        The tokenized titles of df.
+    histograms : tuple of pandas.core.frame.DataFrame
+        Rank histograms of the specialities per teacher and year, and per teacher
+        over all the years, one column per rank (RANKS).
+    slices : dict
+        Rows of the histograms (of the year, or of all the years) by (teacher, academic year).
+    profiles : dict
+        TeacherProfile by (teacher, academic year), filled by teacher_profile.
+    """
+    teachers: List[str]
+    rows: Dict[ProfileKey, np.ndarray]
+    df: pd.DataFrame
+    index: TermIndex
+    histograms: Tuple[pd.DataFrame, pd.DataFrame]
+    slices: Dict[ProfileKey, slice]
+    profiles: Dict[ProfileKey, TeacherProfile]
+
+
+def histogram_slices(histogram: pd.DataFrame, number_of_keys: int) -> Dict[Tuple, slice]:
+    """ Rows of every group of a histogram sorted on its first number_of_keys index levels """
+    codes = np.stack(histogram.index.codes[:number_of_keys], axis=1)
+    starts = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]).any(axis=1)])
+    ends = np.r_[starts[1:], len(codes)]
+    levels = histogram.index.levels[:number_of_keys]
+    return {tuple(level[code] for level, code in zip(levels, codes[start])): slice(start, end)
+            for start, end in zip(starts, ends)}
+
+
+def build_teacher_profiles(df: pd.DataFrame, cube: Cube, index: TermIndex) -> TeacherProfiles:
+    """ Index the subjects of every teacher, for every year and for all the years
+
+    Only the row positions and the rank histograms of all the profiles are computed
+    here, in a few vectorized passes; a profile itself is built the first time it is
+    looked up (see teacher_profile), as most teachers are never selected.
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The preprocessed data (see lib.preprocessing.prepare_data).
+    cube : Cube
+        The pre-aggregated counts of the data (see lib.aggregation.build_cube).
+    index : TermIndex
+        The tokenized titles (see lib.preprocessing.build_term_index).
+
+    Returns:
+    --------
+
+    profiles : TeacherProfiles
+    """
+
+    teachers = df['Teacher'].cat.categories
+    years = df['Academic-year'].cat.categories
+    teacher_codes = df['Teacher'].cat.codes.to_numpy().astype(np.int64)
+    year_codes = df['Academic-year'].cat.codes.to_numpy().astype(np.int64)
+
+    positions = {(teachers[code], None): rows for code, rows in group_positions(teacher_codes).items()}
+    for code, rows in group_positions(teacher_codes * len(years) + year_codes).items():
+        positions[(teachers[code // len(years)], years[code % len(years)])] = rows
+
+    # One rank histogram per teacher and year, and per teacher over all the years
+    histograms = []
+    slices = {}
+    for keys in (['Teacher', 'Academic-year'], ['Teacher']):
+        histogram = cube.priorities.groupby(keys + ['Speciality', 'Priority'], observed=True)['count'].sum()
+        histogram = histogram.unstack(fill_value=0).reindex(columns=RANKS, fill_value=0)
+        for key, rows in histogram_slices(histogram, len(keys)).items():
+            slices[key if len(keys) > 1 else (key[0], None)] = rows
+        histograms.append(histogram)
+
+    teacher_list = sorted(teacher for teacher, year in positions if year is None)
+    return TeacherProfiles(teachers=teacher_list, rows=positions, df=df, index=index,
+                           histograms=tuple(histograms), slices=slices, profiles={})
+
+
+def teacher_profile(profiles: TeacherProfiles, teacher: str,
+                    year: Optional[str] = None) -> Optional[TeacherProfile]:
+    """ Profile of a teacher for a year (None means all of them), None if no subject was proposed
+
+    The profile is built on the first lookup and kept in profiles.profiles.
+    """
+
+    key = (teacher, year)
+    profile = profiles.profiles.get(key)
+    if profile is not None or key not in profiles.rows:
+        return profile
+
+    rows = profiles.rows[key]
+    histogram = profiles.histograms[year is None]
+    ranks = histogram.iloc[profiles.slices.get(key, slice(0, 0))]
+    ranks = ranks.droplevel(list(range(ranks.index.nlevels - 1)))
+    profile = TeacherProfile(
+        rows=rows,
+        grade=profiles.df['Grade'].iloc[rows[0]],
+        number_of_topics=len(rows),
+        number_of_topics_taken=int(profiles.df['Taken'].to_numpy()[rows].sum()),
+        scores=histogram_scores(ranks, len(rows)),
+        top_terms=cloud_frequencies(profiles.index, rows).nlargest(TOP_TERMS, keep='first'),
+    )
+    profiles.profiles[key] = profile
+    return profile
@@ -0,0 +1,287 @@
+"""Teacher similarity and recommendations
+
+Every teacher is described by one row of a teacher × feature matrix:
+
+- the share of their subjects giving every rank (Priority 1 to 5) to every speciality,
+- their grade (one column per grade),
+- the percentage of their subjects taken by a student,
+- the TF-IDF weights of the most frequent terms of their titles.
+
+Each block of features is scaled to unit length, then weighted, so that the
+vocabulary does not outweigh the few columns of the grade. The most similar
+teachers of every teacher (cosine similarity, see lib.neighbours) and the
+teachers ranking every speciality first are computed once per dataset version
+and stored next to the columnar cache, the pages only read them.
+
+"""
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from lib.dataset import count_priorities, priority_matrix
+from lib.neighbours import cosine_top_k, normalize_rows
+from lib.preprocessing import PRIORITY_COLUMNS, TermIndex, get_cache_paths, read_arrays, write_arrays
+
+# Only the most frequent terms are features, the matrix stays dense and small
+TERM_FEATURES = 512
+FEATURE_WEIGHTS = {'priorities': 1.0, 'grade': 0.5, 'taken': 0.5, 'terms': 1.0}
+SIMILAR_TEACHERS = 10
+MAX_RECOMMENDATIONS = 50
+# A speciality at Priority 1 weighs 1, at Priority 5 it weighs 0.2
+RANK_WEIGHTS = np.arange(len(PRIORITY_COLUMNS), 0, -1) / len(PRIORITY_COLUMNS)
+# Bump whenever TeacherMatrix changes, so that older files are computed again
+MATRIX_VERSION = 2
+
+
+class TeacherMatrix(NamedTuple):
+    """ The features of every teacher and what is precomputed from them
+
+    teachers : pandas.core.indexes.base.Index
+        Names of the teachers, in the order of the rows below.
+    grades : numpy.ndarray
+        Grade of every teacher on their first subject ('' when unknown).
+    topics : numpy.ndarray
+        Number of subjects of every teacher.
+    taken : numpy.ndarray
+        Share of the subjects of every teacher taken by a student.
+    features : pandas.core.indexes.base.Index
+        Name of every column of the vectors.
+    vectors : numpy.ndarray
+        Of shape (teachers, features), float32.
+    neighbours : numpy.ndarray
+        Of shape (teachers, SIMILAR_TEACHERS), the most similar teachers first (-1 when there are no more).
+    similarities : numpy.ndarray
+        Cosine similarity of these teachers.
+    specialities : pandas.core.indexes.base.Index
+    firsts : numpy.ndarray
+        Of shape (teachers, specialities), the number of subjects of the teacher
+        giving the first priority to the speciality.
+    fit : numpy.ndarray
+        Of shape (teachers, specialities), the number of subjects of the teacher
+        prioritizing the speciality, weighted by the rank (RANK_WEIGHTS).
+    rankings : numpy.ndarray
+        Of shape (specialities, MAX_RECOMMENDATIONS), the teachers of the largest
+        fit of every speciality first (-1 when there are no more).
+    """
+    teachers: pd.Index
+    grades: np.ndarray
+    topics: np.ndarray
+    taken: np.ndarray
+    features: pd.Index
+    vectors: np.ndarray
+    neighbours: np.ndarray
+    similarities: np.ndarray
+    specialities: pd.Index
+    firsts: np.ndarray
+    fit: np.ndarray
+    rankings: np.ndarray
+
+
+def teacher_matrix_path(path: str) -> str:
+    """ File of the teacher matrix of a dataset, next to its columnar cache """
+    cache_path, manifest_path = get_cache_paths(path)
+    return os.path.splitext(cache_path)[0] + '.teachers.npz'
+
+
+def term_features(index: TermIndex, teacher_codes: np.ndarray, number_of_teachers: int,
+                  number_of_terms: int = TERM_FEATURES) -> Tuple[pd.Index, np.ndarray]:
+    """ TF-IDF weights of the most frequent terms in the titles of every teacher
+
+    Returns:
+    --------
+
+    terms : pandas.core.indexes.base.Index
+        Display form of the terms of the columns.
+    weights : numpy.ndarray
+        Of shape (teachers, terms), float32.
+    """
+
+    document_frequencies = np.diff(index.postings_ptr)
+    kept = np.argsort(-document_frequencies, kind='stable')[:number_of_terms]
+    columns = np.full(len(index.vocabulary), -1, dtype=np.int64)
+    columns[kept] = np.arange(len(kept))
+
+    subjects = np.repeat(teacher_codes, np.diff(index.indptr))
+    entry_columns = columns[index.terms]
+    known = (entry_columns >= 0) & (subjects >= 0)
+    idf = np.log((1 + len(teacher_codes)) / (1 + document_frequencies[kept])) + 1
+    weights = np.bincount(subjects[known] * len(kept) + entry_columns[known],
+                          weights=index.counts[known] * idf[entry_columns[known]],
+                          minlength=number_of_teachers * len(kept))
+    return index.labels[kept], weights.reshape(number_of_teachers, len(kept)).astype(np.float32)
+
+
+def teacher_features(df: pd.DataFrame, index: TermIndex) -> Tuple[pd.Index, np.ndarray, Dict[str, np.ndarray]]:
+    """ The teacher × feature matrix
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The preprocessed data (see lib.preprocessing.prepare_data).
+    index : TermIndex
+        The tokenized titles (see lib.preprocessing.build_term_index).
+
+    Returns:
+    --------
+
+    features : pandas.core.indexes.base.Index
+        Name of every column.
+    vectors : numpy.ndarray
+        Of shape (teachers, features), float32, in the order of the Teacher categories.
+    details : dict
+        The 'grades', 'topics', 'taken' and priority 'counts' (rank, teacher,
+        speciality) the features were computed from.
+    """
+
+    teachers = df['Teacher'].cat.categories
+    teacher_codes = df['Teacher'].cat.codes.to_numpy().astype(np.int64)
+    known = teacher_codes >= 0
+    topics = np.bincount(teacher_codes[known], minlength=len(teachers))
+    taken = np.bincount(teacher_codes[known], weights=df['Taken'].to_numpy()[known].astype(float),
+                        minlength=len(teachers)) / np.maximum(topics, 1)
+
+    matrix = priority_matrix(df)
+    counts = count_priorities(matrix, teacher_codes, len(teachers))
+    priorities = counts.transpose(1, 0, 2).reshape(len(teachers), -1) / np.maximum(topics, 1)[:, None]
+    priority_names = [f'{column}: {speciality}' for column in PRIORITY_COLUMNS for speciality in matrix.specialities]
+
+    # The grade of a teacher is the one of their first subject, like in their profile
+    codes, first_rows = np.unique(teacher_codes[known], return_index=True)
+    grade_codes = np.full(len(teachers), -1, dtype=np.int64)
+    grade_codes[codes] = df['Grade'].cat.codes.to_numpy()[np.flatnonzero(known)[first_rows]]
+    grades = np.zeros((len(teachers), len(df['Grade'].cat.categories)))
+    grades[np.flatnonzero(grade_codes >= 0), grade_codes[grade_codes >= 0]] = 1
+
+    # Two columns so that the cosine compares the percentages themselves
+    taken_columns = np.column_stack([taken, 1 - taken]) * (topics > 0)[:, None]
+
+    terms, term_weights = term_features(index, teacher_codes, len(teachers))
+
+    blocks = {'priorities': priorities, 'grade': grades, 'taken': taken_columns, 'terms': term_weights}
+    vectors = np.hstack([normalize_rows(np.asarray(block, dtype=np.float32)) * FEATURE_WEIGHTS[name]
+                         for name, block in blocks.items()]).astype(np.float32)
+    features = pd.Index(priority_names + [f'Grade: {grade}' for grade in df['Grade'].cat.categories]
+                        + ['Taken', 'Not taken'] + [f'Term: {term}' for term in terms])
+    grade_names = np.where(grade_codes >= 0, np.asarray(df['Grade'].cat.categories, dtype=object)[grade_codes], '')
+    return features, vectors, {'grades': grade_names, 'topics': topics, 'taken': taken, 'counts': counts}
+
+
+def speciality_rankings(fit: np.ndarray, limit: int = MAX_RECOMMENDATIONS) -> np.ndarray:
+    """ The teachers of the largest fit of every speciality, -1 for the teachers without any """
+    order = np.argsort(-fit, axis=0, kind='stable')[:limit].T
+    scores = np.take_along_axis(fit.T, order, axis=1)
+    rankings = np.full((fit.shape[1], limit), -1, dtype=np.int64)
+    rankings[:, :order.shape[1]] = np.where(scores > 0, order, -1)
+    return rankings
+
+
+def read_teacher_matrix(matrix_path: str) -> Tuple[Optional[TeacherMatrix], str]:
+    """ The teacher matrix stored in a file, with the dataset version it was computed for """
+    stored, version = read_arrays(matrix_path, MATRIX_VERSION)
+    if stored is None:
+        return None, ''
+    matrix = TeacherMatrix(**{field: stored[field] for field in TeacherMatrix._fields})
+    return matrix._replace(teachers=pd.Index(matrix.teachers.tolist(), dtype=object),
+                           grades=matrix.grades.astype(object),
+                           features=pd.Index(matrix.features.tolist(), dtype=object),
+                           specialities=pd.Index(matrix.specialities.tolist(), dtype=object)), version
+
+
+def write_teacher_matrix(matrix_path: str, matrix: TeacherMatrix, version: str) -> None:
+    write_arrays(matrix_path, matrix._asdict(), version, MATRIX_VERSION)
+
+
+def build_teacher_matrix(df: pd.DataFrame, index: TermIndex, matrix_path: Optional[str] = None,
+                         version: str = '') -> TeacherMatrix:
+    """ The teacher matrix of the data, read from matrix_path when it was stored for this version
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The preprocessed data (see lib.preprocessing.prepare_data).
+    index : TermIndex
+        The tokenized titles (see lib.preprocessing.build_term_index).
+    matrix_path : str | None
+        File of the stored matrix (see teacher_matrix_path), None to compute it in memory only.
+    version : str
+        Dataset version token of the data.
+
+    Returns:
+    --------
+
+    matrix : TeacherMatrix
+    """
+
+    if matrix_path and version:
+        matrix, stored_version = read_teacher_matrix(matrix_path)
+        if matrix is not None and stored_version == version:
+            return matrix
+
+    features, vectors, details = teacher_features(df, index)
+    neighbours, similarities = cosine_top_k(vectors, SIMILAR_TEACHERS)
+    fit = np.tensordot(RANK_WEIGHTS, details['counts'], axes=1).astype(np.float32)
+    matrix = TeacherMatrix(teachers=df['Teacher'].cat.categories, grades=details['grades'], topics=details['topics'],
+                           taken=details['taken'], features=features, vectors=vectors, neighbours=neighbours,
+                           similarities=similarities, specialities=df[PRIORITY_COLUMNS[0]].cat.categories,
+                           firsts=details['counts'][0], fit=fit,
+                           rankings=speciality_rankings(fit))
+    if matrix_path:
+        try:
+            write_teacher_matrix(matrix_path, matrix, version)
+        except OSError:
+            # Read-only deployments compute the matrix again at every start
+            pass
+    return matrix
+
+
+def describe_teachers(matrix: TeacherMatrix, teachers: np.ndarray) -> pd.DataFrame:
+    """ Grade, number of subjects and percentage of taken of some teachers (row positions) """
+    return pd.DataFrame({
+        'Teacher': matrix.teachers[teachers],
+        'Grade': matrix.grades[teachers],
+        'Topics': matrix.topics[teachers],
+        'Taken (%)': (matrix.taken[teachers] * 100).round().astype(int),
+    })
+
+
+def nearest_teachers(matrix: TeacherMatrix, teacher: str) -> pd.DataFrame:
+    """ The teachers of the most similar features, most similar first
+
+    Returns:
+    --------
+
+    similar : pandas.core.frame.DataFrame
+        With the columns 'Teacher', 'Similarity (%)', 'Grade', 'Topics' and 'Taken (%)'.
+    """
+
+    position = matrix.teachers.get_indexer([teacher])[0]
+    neighbours = matrix.neighbours[position] if position >= 0 else np.zeros(0, dtype=np.int64)
+    found = neighbours >= 0
+    similar = describe_teachers(matrix, neighbours[found])
+    similar.insert(1, 'Similarity (%)', (matrix.similarities[position][found].astype(float) * 100).round(1)
+                   if position >= 0 else [])
+    return similar
+
+
+def recommended_teachers(matrix: TeacherMatrix, speciality: str) -> pd.DataFrame:
+    """ The teachers whose subjects give the best priorities to a speciality
+
+    Returns:
+    --------
+
+    recommended : pandas.core.frame.DataFrame
+        Largest fit first, with the columns 'Teacher', 'Fit', 'Priority 1' (number of
+        subjects giving the first priority to the speciality), 'Grade', 'Topics' and 'Taken (%)'.
+    """
+
+    column = matrix.specialities.get_indexer([speciality])[0]
+    teachers = matrix.rankings[column] if column >= 0 else np.zeros(0, dtype=np.int64)
+    teachers = teachers[teachers >= 0]
+    recommended = describe_teachers(matrix, teachers)
+    recommended.insert(1, 'Fit', matrix.fit[teachers, column].astype(float).round(1))
+    recommended.insert(2, 'Priority 1', matrix.firsts[teachers, column])
+    return recommended
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from lib.aggregation import Cube
+
+RANKS = [1, 2, 3, 4, 5]
+
+
+def speciality_scores(cube: Cube) -> pd.DataFrame:
+    """ Rank statistics of every speciality over the subjects of a (sliced) cube
+
+    The priorities of the cube are the Priority 1-5 columns melted into a long
+    (speciality, rank) table and already counted, so every statistic below comes
+    out of a single groupby over the groups of the cube, whatever the filter
+    (year, teacher, grade) the cube was sliced with.
+
+    Parameters:
+    -----------
+
+    cube : Cube
+        The pre-aggregated counts (see lib.aggregation.build_cube and slice_cube).
+
+    Returns:
+    --------
+
+    scores : pandas.core.frame.DataFrame
+        Indexed by speciality, with the columns:
+        - Priority 1 ... Priority 5: number of subjects giving that rank to the speciality
+        - Average: sum of the ranks divided by the number of subjects (the lower the better)
+        - Median: median rank of the speciality over the subjects that rank it
+    """
+
+    priorities = cube.priorities
+    histogram = priorities.groupby(['Speciality', 'Priority'], observed=True)['count'].sum()
+    histogram = histogram.unstack(fill_value=0).reindex(columns=RANKS, fill_value=0)
+    return histogram_scores(histogram, cube.subjects['count'].sum())
+
+
+def histogram_scores(histogram: pd.DataFrame, number_of_topics: int) -> pd.DataFrame:
+    """ Rank statistics of every speciality from its rank histogram
+
+    Parameters:
+    -----------
+
+    histogram : pandas.core.frame.DataFrame
+        Number of subjects indexed by speciality, one column per rank (RANKS).
+    number_of_topics : int
+        Number of subjects the histogram was counted over.
+
+    Returns:
+    --------
+
+    scores : pandas.core.frame.DataFrame
+        See speciality_scores.
+    """
+
+    counts = histogram.to_numpy()
+    kept = counts.sum(axis=1) > 0
+    counts = counts[kept]
+    ranks = np.array(RANKS)
+    cumulative = counts.cumsum(axis=1)
+
+    # Built in one go: this runs once per teacher and year
+    scores = {f'Priority {rank}': counts[:, position] for position, rank in enumerate(RANKS)}
+    scores['Average'] = (counts @ ranks / max(number_of_topics, 1)).round(2)
+    scores['Median'] = ranks[np.argmax(cumulative >= cumulative[:, -1:] / 2, axis=1)]
+    return pd.DataFrame(scores, index=histogram.index[kept])
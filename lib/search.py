@@ -0,0 +1,87 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from lib.preprocessing import TermIndex, tokenize
+
+# Okapi BM25 parameters
+K1 = 1.5
+B = 0.75
+
+
+class SearchIndex(NamedTuple):
+    """ BM25 ranking of the subject titles
+
+    index : TermIndex
+        The tokenized titles (see lib.preprocessing.build_term_index).
+    idf : numpy.ndarray
+        Inverse document frequency of each term.
+    length_norm : numpy.ndarray
+        BM25 length normalization of each subject, 1 - B + B * length / average length.
+    """
+    index: TermIndex
+    idf: np.ndarray
+    length_norm: np.ndarray
+
+
+def build_search_index(index: TermIndex) -> SearchIndex:
+    """ Precompute the per term and per subject parts of the BM25 scores """
+    number_of_subjects = len(index.indptr) - 1
+    subjects_per_term = np.diff(index.postings_ptr)
+    idf = np.log(1 + (number_of_subjects - subjects_per_term + 0.5) / (subjects_per_term + 0.5))
+    subjects = np.repeat(np.arange(number_of_subjects), np.diff(index.indptr))
+    lengths = np.bincount(subjects, weights=index.counts, minlength=number_of_subjects)
+    length_norm = 1 - B + B * lengths / max(lengths.mean(), 1)
+    return SearchIndex(index=index, idf=idf, length_norm=length_norm)
+
+
+def query_terms(index: TermIndex, query: str) -> np.ndarray:
+    """ Codes of the known terms of a query, bigrams included ('deep learning') """
+    keys = tokenize(pd.Series([query]), stop_words=())['key'].tolist()
+    keys += [first + ' ' + second for first, second in zip(keys, keys[1:])]
+    codes = index.vocabulary.get_indexer(keys)
+    return np.unique(codes[codes >= 0])
+
+
+def search(search_index: SearchIndex, query: str, mask: Optional[np.ndarray] = None,
+           limit: int = 50) -> pd.Series:
+    """ Rank the subjects matching a query
+
+    Only the postings of the query terms are visited, so the cost depends on how
+    many subjects contain them and not on the size of the corpus.
+
+    Parameters:
+    -----------
+
+    search_index : SearchIndex
+    query : str
+        Free text, normalized like the titles.
+    mask : numpy.ndarray | None
+        Boolean array with one entry per subject, only the True ones are returned.
+    limit : int
+        Maximum number of results.
+
+    Returns:
+    --------
+
+    scores : pandas.core.series.Series
+        BM25 score indexed by the row position of the subject, best first.
+    """
+
+    index = search_index.index
+    scores = np.zeros(len(search_index.length_norm))
+    for term in query_terms(index, query):
+        start, end = index.postings_ptr[term], index.postings_ptr[term + 1]
+        subjects = index.postings[start:end]
+        frequency = index.postings_counts[start:end]
+        scores[subjects] += search_index.idf[term] * frequency * (K1 + 1) / (
+            frequency + K1 * search_index.length_norm[subjects])
+
+    if mask is not None:
+        scores[~mask] = 0
+    matches = np.flatnonzero(scores)
+    if len(matches) > limit:
+        matches = matches[np.argpartition(-scores[matches], limit)[:limit]]
+    matches = matches[np.argsort(-scores[matches], kind='stable')]
+    return pd.Series(scores[matches], index=matches)
@@ -0,0 +1,451 @@
+"""Static snapshot
+
+Renders the read-only views of the dashboard into a static site, to be served
+instead of the live app when most visits only look at the same few filters:
+
+- the homepage,
+- General Statistics, for every academic year and for all of them,
+- Teacher Statistics, for every teacher and every year they proposed subjects in,
+- Academic Year Trends, over all the years,
+- Teacher Finder, for every speciality.
+
+The sections of the pages are the ones of the app (lib.views), written as HTML:
+the charts are embedded as Vega-Lite specs drawn by vega-embed in the browser,
+the word clouds are PNG files. The vega scripts are loaded from the CDN at pinned
+versions, checked against their hash by the browser, or copied into the site with
+--offline (from the altair_viewer package) for a site working without network
+access. The views are rendered in parallel by a process pool, every worker loads
+the data once.
+
+Usage: python -m lib.snapshot dataset/subjects --output site [--workers 4] [--offline]
+
+"""
+import argparse
+import base64
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from lib import views
+from lib.aggregation import Cube, build_cube
+from lib.analytics import global_statistics, priority_scores
+from lib.dataset import take
+from lib.preprocessing import TermIndex, build_term_index, cloud_frequencies, dataset_version, load_stop_words, \
+    prepare_data
+from lib.profiles import TeacherProfiles, build_teacher_profiles, teacher_profile
+from lib.recommendations import TeacherMatrix, build_teacher_matrix, teacher_matrix_path
+from lib.themes import Themes, build_themes, theme_model_path
+from lib.years import ALL_YEARS, YearIndex, build_year_index, year_options
+
+# Package, version and subresource integrity hash of the vega scripts, Vega-Lite
+# 4.17 is the version of the specs of altair 4
+VEGA_SCRIPTS = [('vega', '5.21.0', 'sha384-s2nYi9D0FfKNopEKsfINeS1Ffhcf+5uvwIrb7Zqso2II+HPhzBTWvXClt+NdUwFc'),
+                ('vega-lite', '4.17.0', 'sha384-Lk76BfFIvNLUmTFmFz5tTLsyZm84P0HIeOI/vFqXLMmiysiih15Ey5s/uuizSEve'),
+                ('vega-embed', '6.20.0', 'sha384-gfKoOUGUlUEj3xzMf+qYux09to6GnCOBHkPvu5Z3qKD6BMcNG8KNe1mlRQAbeIAO')]
+VEGA_CDN = 'https://cdn.jsdelivr.net/npm/{package}@{version}'
+# Directory of the copied scripts in the site (--offline)
+VENDOR_DIR = 'vendor'
+BADGE_PATH = os.path.join('images', 'badge.png')
+# Views handed to a worker at once
+CHUNK_SIZE = 16
+
+View = Tuple[str, ...]
+
+
+class SnapshotData(NamedTuple):
+    """ Everything the views are rendered from, loaded once per worker """
+    df: pd.DataFrame
+    global_stats: Dict
+    cube: Cube
+    index: TermIndex
+    year_index: YearIndex
+    profiles: TeacherProfiles
+    themes: Themes
+    matrix: TeacherMatrix
+    # The vega scripts are copied into the site instead of loaded from the CDN
+    offline: bool = False
+
+
+class Page(NamedTuple):
+    """ A rendered view
+
+    path : str
+        Path of the HTML file, relative to the root of the site.
+    html : str
+    images : dict
+        PNG bytes by path relative to the root of the site.
+    """
+    path: str
+    html: str
+    images: Dict[str, bytes]
+
+
+_data: Optional[SnapshotData] = None
+
+
+def load_snapshot_data(source: str, offline: bool = False) -> SnapshotData:
+    """ The data and its indexes, as the app loads them (see app.py) """
+    df = prepare_data(source)
+    version = dataset_version(source)
+    cube = build_cube(df)
+    index = build_term_index(df['Title'], load_stop_words())
+    return SnapshotData(df=df, global_stats=global_statistics(df), cube=cube, index=index,
+                        year_index=build_year_index(df, cube),
+                        profiles=build_teacher_profiles(df, cube, index),
+                        themes=build_themes(df, index, theme_model_path(source), version),
+                        matrix=build_teacher_matrix(df, index, teacher_matrix_path(source), version),
+                        offline=offline)
+
+
+def slugify(text: str) -> str:
+    """ File name of a teacher, a year or a speciality: ascii letters, digits and dashes """
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^A-Za-z0-9]+', '-', text).strip('-').lower() or 'none'
+
+
+def year_slug(year: str) -> str:
+    return 'all' if year == ALL_YEARS else slugify(year)
+
+
+def teacher_slug(data: SnapshotData, teacher: str) -> str:
+    """ Unique even when two names only differ by their accents """
+    return f'{slugify(teacher)}-{data.df["Teacher"].cat.categories.get_loc(teacher)}'
+
+
+def view_path(data: SnapshotData, view: View) -> str:
+    kind = view[0]
+    if kind == 'home':
+        return 'index.html'
+    if kind == 'general':
+        return f'general/{year_slug(view[1])}.html'
+    if kind == 'teacher':
+        return f'teachers/{teacher_slug(data, view[1])}/{year_slug(view[2])}.html'
+    if kind == 'teachers':
+        return 'teachers/index.html'
+    if kind == 'trends':
+        return 'trends.html'
+    if kind == 'finder':
+        return f'finder/{slugify(view[1])}.html'
+    raise ValueError(f'Unknown view {view}')
+
+
+def snapshot_views(data: SnapshotData) -> List[View]:
+    """ Every view of the site, the pages of the teachers last """
+    years = year_options(data.year_index)
+    site_views: List[View] = [('home',), ('teachers',), ('trends',)]
+    site_views += [('general', year) for year in years]
+    site_views += [('finder', speciality) for speciality in data.matrix.specialities]
+    site_views += [('teacher', teacher, year) for teacher in data.profiles.teachers for year in years
+                   if (teacher, None if year == ALL_YEARS else year) in data.profiles.rows]
+    return site_views
+
+
+def relative_link(page_path: str, target: str) -> str:
+    """ Link from a page to another one, both relative to the root of the site """
+    return os.path.relpath(target, os.path.dirname(page_path) or '.').replace(os.sep, '/')
+
+
+def chart_html(spec: Dict, name: str) -> str:
+    """ A Vega-Lite spec, drawn by vega-embed """
+    spec = json.dumps(spec).replace('</', '<\\/')
+    return f'<div id="{name}"></div>\n<script>vegaEmbed("#{name}", {spec}, {{"actions": false}});</script>'
+
+
+def table_html(frame: pd.DataFrame) -> str:
+    """ A table, its index is shown as its first column when it is named """
+    if frame.index.name is not None:
+        frame = frame.reset_index()
+    return frame.to_html(index=False, border=0, classes='table', na_rep='')
+
+
+def links_html(page_path: str, links: List[Tuple[str, str]], current: Optional[str] = None) -> str:
+    """ A line of links (label, target path), the current one in bold """
+    items = [f'<b>{html.escape(label)}</b>' if target == current else
+             f'<a href="{relative_link(page_path, target)}">{html.escape(label)}</a>' for label, target in links]
+    return '<p class="links">' + ' · '.join(items) + '</p>'
+
+
+def script_integrity(content: bytes) -> str:
+    return 'sha384-' + base64.b64encode(hashlib.sha384(content).digest()).decode('ascii')
+
+
+def script_html(page_path: str, package: str, version: str, integrity: str, offline: bool) -> str:
+    """ A vega script, copied into the site or loaded from the CDN, the browser checks its hash then """
+    if offline:
+        return f'<script src="{relative_link(page_path, f"{VENDOR_DIR}/{package}@{version}.js")}"></script>'
+    return (f'<script src="{VEGA_CDN.format(package=package, version=version)}" integrity="{integrity}" '
+            f'crossorigin="anonymous"></script>')
+
+
+def copy_vega_scripts(output: str) -> None:
+    """ Copy the vega scripts into the site, from the ones bundled by altair_viewer """
+    try:
+        from altair_viewer import get_bundled_script
+    except ImportError as error:
+        raise ImportError('--offline copies the vega scripts of altair_viewer: pip install altair_viewer') from error
+    os.makedirs(os.path.join(output, VENDOR_DIR), exist_ok=True)
+    for package, version, integrity in VEGA_SCRIPTS:
+        content = get_bundled_script(package, version).encode('utf-8')
+        if script_integrity(content) != integrity:
+            raise ValueError(f'The {package}@{version} script of altair_viewer does not match its pinned hash')
+        with open(os.path.join(output, VENDOR_DIR, f'{package}@{version}.js'), 'wb') as f:
+            f.write(content)
+
+
+def page_html(data: SnapshotData, page_path: str, title: str, body: List[str]) -> str:
+    menu = [('Homepage', 'index.html'), ('General Statistics', view_path(data, ('general', ALL_YEARS))),
+            ('Teacher Statistics', 'teachers/index.html'), ('Academic Year Trends', 'trends.html'),
+            ('Teacher Finder', view_path(data, ('finder', data.matrix.specialities[0])))]
+    scripts = '\n'.join(script_html(page_path, package, version, integrity, data.offline)
+                        for package, version, integrity in VEGA_SCRIPTS)
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+{scripts}
+<style>
+body {{ font-family: sans-serif; max-width: 960px; margin: 0 auto; padding: 1em; }}
+.links {{ line-height: 1.8; }}
+.table {{ border-collapse: collapse; font-size: 0.9em; }}
+.table td, .table th {{ border-bottom: 1px solid #ddd; padding: 0.3em 0.6em; text-align: left; }}
+.metric {{ display: inline-block; margin-right: 3em; font-size: 1.4em; }}
+.metric small {{ display: block; font-size: 0.6em; color: #666; }}
+img {{ max-width: 100%; }}
+</style>
+</head>
+<body>
+<nav>{links_html(page_path, menu)}</nav>
+<h1>{html.escape(title)}</h1>
+{chr(10).join(body)}
+</body>
+</html>
+"""
+
+
+def markdown_html(text: str) -> str:
+    """ The markdown of the pages: a paragraph or a list item, in bold (**) or bold italic (___) """
+    text = html.escape(text, quote=False).replace('&amp;nbsp;', '&nbsp;')
+    text = re.sub(r'___(.+?)___', r'<b><i>\1</i></b>', text)
+    text = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', text)
+    if text.startswith('- '):
+        return f'<ul><li>{text[2:]}</li></ul>'
+    return f'<p>{text}</p>'
+
+
+def metric_html(metric: views.Metric) -> str:
+    delta = '' if metric.delta is None else f'<small>{html.escape(str(metric.delta))}</small>'
+    return (f'<span class="metric"><small>{html.escape(metric.label)}</small>'
+            f'{html.escape(str(metric.value))}{delta}</span>')
+
+
+def word_cloud_html(data: SnapshotData, page_path: str, block: views.WordCloud, images: Dict[str, bytes]) -> str:
+    """ Render the word cloud next to the page, empty when there are no words to draw """
+    from lib.word_cloud import render_word_cloud
+    frequencies = block.frequencies if block.frequencies is not None else cloud_frequencies(data.index, block.rows)
+    if not len(frequencies):
+        return ''
+    image_path = os.path.splitext(page_path)[0] + '.png'
+    images[image_path] = render_word_cloud(frequencies)
+    return f'<img src="{relative_link(page_path, image_path)}" alt="Word cloud">'
+
+
+def blocks_html(data: SnapshotData, page_path: str, blocks: List[views.Block], images: Dict[str, bytes]) -> List[str]:
+    """ The sections of a page (see lib.views) as HTML, their word clouds are added to images """
+    body = []
+    for block in blocks:
+        if isinstance(block, views.Heading):
+            body.append(f'<h{block.level}>{html.escape(block.text)}</h{block.level}>')
+        elif isinstance(block, views.Text):
+            body.append(markdown_html(block.markdown))
+        elif isinstance(block, views.Chart):
+            body.append(chart_html(views.chart_spec(block), f'chart-{len(body)}'))
+        elif isinstance(block, views.Metrics):
+            body.append(''.join(metric_html(metric) for metric in block.metrics))
+        elif isinstance(block, views.Table):
+            body.append(table_html(block.frame))
+        elif isinstance(block, views.Topics):
+            body.append(table_html(take(data.df, block.rows, block.columns)))
+        elif isinstance(block, views.WordCloud):
+            body.append(word_cloud_html(data, page_path, block, images))
+    return body
+
+
+def option_blocks(charts: Dict[str, views.Chart]) -> List[views.Block]:
+    """ The charts of every option of a 'Priority?' select box of the pages, one after the other """
+    blocks: List[views.Block] = []
+    for option, chart in charts.items():
+        blocks.append(views.Text('**Average priority**' if option == 'average' else f'**Priority {option}**'))
+        blocks.append(chart)
+    return blocks
+
+
+def render_home(data: SnapshotData, view: View) -> Page:
+    path = view_path(data, view)
+    body = [f'<img src="{relative_link(path, "badge.png")}" alt="Master Subjects Analysis">',
+            '<blockquote>A Dashboard for Exploratory Data Analysis of proposed Master thesis subjects</blockquote>',
+            '<p>The following dashboard gives some insights on the subjects proposed for master\'s thesis. The '
+            'subjects were proposed by teachers so that master students can choose one as their subject.</p>',
+            f'<p>Academic years: {html.escape(", ".join(data.year_index.years))}.</p>',
+            '<p>This is a static snapshot of the dashboard, the live app is needed for the subject search, '
+            'the distinct subjects and the year range filters.</p>']
+    return Page(path=path, html=page_html(data, path, 'Master Subjects Analysis', body), images={})
+
+
+def render_general(data: SnapshotData, view: View) -> Page:
+    year = view[1]
+    path = view_path(data, view)
+    rows = None
+    cube = data.cube
+    if year != ALL_YEARS:
+        rows = data.year_index.rows[year]
+        cube = data.year_index.aggregates[year].cube
+    scores = priority_scores(cube)
+    blocks = (views.general_intro() + views.topics_taken(cube) + views.topics_per_teacher(cube)
+              + views.topics_per_grade(cube) + views.external_departments(cube)
+              + views.prioritized_specialities_intro()
+              + option_blocks({option: views.priority_chart(scores, option) for option in views.PRIORITY_OPTIONS})
+              + views.subjects_word_cloud(('year', year), rows))
+
+    images: Dict[str, bytes] = {}
+    body = [links_html(path, [(option, view_path(data, ('general', option)))
+                              for option in year_options(data.year_index)], current=path)]
+    body += blocks_html(data, path, blocks, images)
+    return Page(path=path, html=page_html(data, path, f'General Statistics, {year}', body), images=images)
+
+
+def render_teachers(data: SnapshotData, view: View) -> Page:
+    path = view_path(data, view)
+    links = [(teacher, view_path(data, ('teacher', teacher, ALL_YEARS))) for teacher in data.profiles.teachers
+             if (teacher, None) in data.profiles.rows]
+    body = ['<ul>'] + [f'<li><a href="{relative_link(path, target)}">{html.escape(teacher)}</a></li>'
+                       for teacher, target in links] + ['</ul>']
+    return Page(path=path, html=page_html(data, path, 'Teacher Statistics', body), images={})
+
+
+def render_teacher(data: SnapshotData, view: View) -> Page:
+    teacher, year = view[1], view[2]
+    path = view_path(data, view)
+    profile = teacher_profile(data.profiles, teacher, None if year == ALL_YEARS else year)
+    specialities = data.global_stats['speciality list']
+    blocks = (views.teacher_intro() + views.teacher_overview(profile, data.global_stats)
+              + views.teacher_priorities_intro()
+              + option_blocks({option: views.priority_chart(profile.scores, option, specialities=specialities)
+                               for option in views.PRIORITY_OPTIONS})
+              + views.teacher_word_cloud(('teacher', teacher, year), profile.top_terms)
+              + views.teacher_themes(data.themes, teacher, profile.rows)
+              + views.teacher_similar_teachers(data.matrix, teacher)
+              + views.teacher_topics(profile.rows))
+
+    options = [option for option in year_options(data.year_index)
+               if (teacher, None if option == ALL_YEARS else option) in data.profiles.rows]
+    images: Dict[str, bytes] = {}
+    body = [links_html(path, [(option, view_path(data, ('teacher', teacher, option))) for option in options],
+                       current=path)]
+    body += blocks_html(data, path, blocks, images)
+    return Page(path=path, html=page_html(data, path, f'Teacher Statistics for {teacher}, {year}', body),
+                images=images)
+
+
+def render_trends(data: SnapshotData, view: View) -> Page:
+    path = view_path(data, view)
+    years = data.year_index.years
+    blocks = views.trends_intro()
+    if len(years) > 1:
+        blocks += (views.topics_per_year(data.year_index, years) + views.speciality_trends_intro()
+                   + option_blocks({option: views.speciality_trend_chart(data.year_index, years, option)
+                                    for option in views.PRIORITY_OPTIONS}))
+    body = blocks_html(data, path, blocks, {})
+    return Page(path=path, html=page_html(data, path, 'Academic Year Trends', body), images={})
+
+
+def render_finder(data: SnapshotData, view: View) -> Page:
+    speciality = view[1]
+    path = view_path(data, view)
+    body = [links_html(path, [(option, view_path(data, ('finder', option))) for option in data.matrix.specialities],
+                       current=path)]
+    body += blocks_html(data, path, views.finder_intro() + views.teachers_for_speciality(data.matrix, speciality), {})
+    return Page(path=path, html=page_html(data, path, 'Teacher Finder', body), images={})
+
+
+RENDERERS = {'home': render_home, 'general': render_general, 'teachers': render_teachers,
+             'teacher': render_teacher, 'trends': render_trends, 'finder': render_finder}
+
+
+def write_page(output: str, page: Page) -> None:
+    for path, content in [(page.path, page.html.encode('utf-8'))] + list(page.images.items()):
+        target = os.path.join(output, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(content)
+
+
+def _initialize_worker(source: str, offline: bool) -> None:
+    global _data
+    _data = load_snapshot_data(source, offline)
+
+
+def _render_views(output: str, chunk: List[View]) -> int:
+    for view in chunk:
+        write_page(output, RENDERERS[view[0]](_data, view))
+    return len(chunk)
+
+
+def export_snapshot(source: str, output: str, workers: Optional[int] = None, offline: bool = False) -> int:
+    """ Render every view of the dashboard into a static site
+
+    Parameters:
+    -----------
+
+    source : str
+        csv file or dataset store (see lib.ingest).
+    output : str
+        Directory of the site, its views are overwritten.
+    workers : int | None
+        Number of worker processes, None for one per CPU.
+    offline : bool
+        Copy the vega scripts into the site (needs altair_viewer) instead of
+        loading them from the CDN.
+
+    Returns:
+    --------
+
+    number_of_views : int
+    """
+
+    # Loaded here first so that the themes and the teacher matrix are stored
+    # before the workers start, they only read them
+    site_views = snapshot_views(load_snapshot_data(source))
+    os.makedirs(output, exist_ok=True)
+    if os.path.exists(BADGE_PATH):
+        shutil.copyfile(BADGE_PATH, os.path.join(output, 'badge.png'))
+    if offline:
+        copy_vega_scripts(output)
+    chunks = [site_views[start:start + CHUNK_SIZE] for start in range(0, len(site_views), CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker, initargs=(source, offline)) as executor:
+        return sum(executor.map(_render_views, [output] * len(chunks), chunks))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Render every view of the dashboard into a static site')
+    parser.add_argument('source', help='csv file or dataset store (see lib.ingest)')
+    parser.add_argument('--output', default='site', help='directory of the site')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: one per CPU)')
+    parser.add_argument('--offline', action='store_true',
+                        help='copy the vega scripts into the site (needs altair_viewer) instead of loading them '
+                             'from the CDN')
+    args = parser.parse_args()
+    number_of_views = export_snapshot(args.source, args.output, args.workers, args.offline)
+    print(f'{number_of_views} views written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
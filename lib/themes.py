@@ -0,0 +1,395 @@
+"""Themes of the subjects
+
+A topic model of the titles: every title is a TF-IDF vector over the terms of
+the term index (words and frequent bigrams), and the themes are the centroids of
+a spherical mini-batch k-means over these vectors. It runs on CPU with numpy only.
+
+The model is kept on disk next to the columnar cache of the data. It remembers
+the academic years it was trained on, so when a new year is appended only the
+subjects of that year are used to update the centroids (and the vocabulary and
+document frequencies); the subjects of the other years are only assigned again.
+The themes of the subjects, the theme mixture of every teacher and the teachers
+with the most similar mixtures are stored along with the model for the dataset
+version they were computed for.
+
+Usage: python -m lib.themes dataset/subjects [--retrain]
+
+"""
+import argparse
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from lib.dataset import group_positions
+from lib.neighbours import cosine_top_k
+from lib.preprocessing import TermIndex, build_term_index, dataset_version, get_cache_paths, load_stop_words, \
+    prepare_data, read_arrays, select_entries, write_arrays
+
+NUMBER_OF_THEMES = 12
+MINI_BATCH_SIZE = 1024
+EPOCHS = 10
+LABEL_TERMS = 3
+SIMILAR_TEACHERS = 5
+SEED = 0
+NO_THEME = -1
+# Bump whenever the stored model or themes change shape, so that older files are learnt again
+MODEL_VERSION = 2
+
+
+class ThemeModel(NamedTuple):
+    """ Centroids of the themes and what they were learnt from
+
+    vocabulary : pandas.core.indexes.base.Index
+        Normalized terms (see lib.preprocessing.TermIndex.vocabulary).
+    centroids : numpy.ndarray
+        Of shape (themes, vocabulary), float32, rows of unit length.
+    counts : numpy.ndarray
+        Number of subjects every centroid was updated with, its learning rate decreases with it.
+    document_frequencies : numpy.ndarray
+        Number of training subjects containing every term.
+    number_of_documents : int
+    years : list of str
+        The academic years the model was trained on.
+    """
+    vocabulary: pd.Index
+    centroids: np.ndarray
+    counts: np.ndarray
+    document_frequencies: np.ndarray
+    number_of_documents: int
+    years: List[str]
+
+
+class Themes(NamedTuple):
+    """ The themes of a dataset version
+
+    labels : list of str
+        Name of every theme, its most weighted terms.
+    subjects : numpy.ndarray
+        Theme of every subject (NO_THEME for titles without any term).
+    teachers : pandas.core.indexes.base.Index
+        Names of the teachers, in the order of the rows below.
+    mixtures : numpy.ndarray
+        Of shape (teachers, themes), share of the subjects of a teacher in every theme.
+    neighbours : numpy.ndarray
+        Of shape (teachers, SIMILAR_TEACHERS), the teachers with the most similar
+        mixtures (-1 when there are no more).
+    similarities : numpy.ndarray
+        Cosine similarity of the mixtures of these teachers.
+    """
+    labels: List[str]
+    subjects: np.ndarray
+    teachers: pd.Index
+    mixtures: np.ndarray
+    neighbours: np.ndarray
+    similarities: np.ndarray
+
+
+def theme_model_path(path: str) -> str:
+    """ File of the model and themes of a dataset, next to its columnar cache """
+    cache_path, manifest_path = get_cache_paths(path)
+    return os.path.splitext(cache_path)[0] + '.themes.npz'
+
+
+def tfidf_vectors(index: TermIndex, rows: np.ndarray, columns: np.ndarray,
+                  idf: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Unit length TF-IDF vectors of the given subjects, in the vocabulary of a model
+
+    Parameters:
+    -----------
+
+    index : TermIndex
+    rows : numpy.ndarray
+        Row positions of the subjects.
+    columns : numpy.ndarray
+        Column of every term of the index in the model, -1 for terms it does not know.
+    idf : numpy.ndarray
+        Inverse document frequency of every column.
+
+    Returns:
+    --------
+
+    indptr, columns, values : numpy.ndarray
+        Sparse rows in the layout of TermIndex, subjects without known terms have no entries.
+    """
+
+    entries = select_entries(index.indptr, rows)
+    subjects = np.repeat(np.arange(len(rows)), np.diff(index.indptr)[rows])
+    entry_columns = columns[index.terms[entries]]
+    known = entry_columns >= 0
+    subjects, entry_columns = subjects[known], entry_columns[known]
+    values = index.counts[entries][known] * idf[entry_columns]
+    norms = np.sqrt(np.bincount(subjects, weights=values ** 2, minlength=len(rows)))
+    values = (values / norms[subjects]).astype(np.float32)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(subjects, minlength=len(rows)))])
+    return indptr, entry_columns, values
+
+
+def nearest_centroids(centroids: np.ndarray, indptr: np.ndarray, columns: np.ndarray,
+                      values: np.ndarray) -> np.ndarray:
+    """ Most similar centroid of every sparse row, NO_THEME for empty rows """
+    themes = np.full(len(indptr) - 1, NO_THEME, dtype=np.int64)
+    filled = np.flatnonzero(np.diff(indptr) > 0)
+    if len(filled) == 0 or len(centroids) == 0:
+        return themes
+    contributions = centroids[:, columns].T * values[:, None]
+    scores = np.add.reduceat(contributions, indptr[filled], axis=0)
+    themes[filled] = np.argmax(scores, axis=1)
+    return themes
+
+
+def idf_weights(model: ThemeModel) -> np.ndarray:
+    return np.log((1 + model.number_of_documents) / (1 + model.document_frequencies)) + 1
+
+
+def update_theme_model(model: Optional[ThemeModel], index: TermIndex, rows: np.ndarray, years: List[str],
+                       number_of_themes: int = NUMBER_OF_THEMES, seed: int = SEED) -> ThemeModel:
+    """ Learn the themes of new subjects, starting from an earlier model
+
+    Parameters:
+    -----------
+
+    model : ThemeModel | None
+        The model to update, None to learn one from scratch.
+    index : TermIndex
+        The tokenized titles of the data.
+    rows : numpy.ndarray
+        Row positions of the new subjects.
+    years : list of str
+        The academic years of the new subjects.
+    number_of_themes : int
+        Number of themes of a new model.
+    seed : int
+
+    Returns:
+    --------
+
+    model : ThemeModel
+    """
+
+    rng = np.random.default_rng(seed)
+    if model is None:
+        model = ThemeModel(vocabulary=pd.Index([], dtype=object), centroids=np.zeros((0, 0), dtype=np.float32),
+                           counts=np.zeros(0, dtype=np.int64), document_frequencies=np.zeros(0, dtype=np.int64),
+                           number_of_documents=0, years=[])
+
+    # The vocabulary grows with the terms of the new subjects
+    entries = select_entries(index.indptr, rows)
+    new_terms = np.unique(index.terms[entries])
+    vocabulary = model.vocabulary.append(index.vocabulary[new_terms].difference(model.vocabulary))
+    columns = vocabulary.get_indexer(index.vocabulary)
+    centroids = np.zeros((len(model.centroids), len(vocabulary)), dtype=np.float32)
+    centroids[:, :model.centroids.shape[1]] = model.centroids
+    document_frequencies = np.bincount(columns[index.terms[entries]], minlength=len(vocabulary))
+    document_frequencies[:len(model.document_frequencies)] += model.document_frequencies
+    model = model._replace(vocabulary=vocabulary, centroids=centroids, document_frequencies=document_frequencies,
+                           number_of_documents=model.number_of_documents + len(rows),
+                           years=sorted(set(model.years) | set(years)))
+
+    indptr, entry_columns, values = tfidf_vectors(index, rows, columns, idf_weights(model))
+    filled = np.flatnonzero(np.diff(indptr) > 0)
+    if len(filled) == 0:
+        return model
+    counts = model.counts
+    if len(centroids) == 0:
+        # The first centroids are random subjects
+        seeds = rng.choice(filled, size=min(number_of_themes, len(filled)), replace=False)
+        centroids = np.zeros((len(seeds), len(vocabulary)), dtype=np.float32)
+        for theme, subject in enumerate(seeds):
+            centroids[theme, entry_columns[indptr[subject]:indptr[subject + 1]]] = \
+                values[indptr[subject]:indptr[subject + 1]]
+        counts = np.zeros(len(seeds), dtype=np.int64)
+
+    lengths = np.diff(indptr)
+    for epoch in range(EPOCHS):
+        order = rng.permutation(filled)
+        for start in range(0, len(order), MINI_BATCH_SIZE):
+            batch = np.sort(order[start:start + MINI_BATCH_SIZE])
+            batch_entries = select_entries(indptr, batch)
+            batch_indptr = np.concatenate([[0], np.cumsum(lengths[batch])])
+            batch_columns = entry_columns[batch_entries]
+            themes = nearest_centroids(centroids, batch_indptr, batch_columns, values[batch_entries])
+
+            # Every centroid moves towards the mean of its subjects, less and less as it sees more.
+            # The sums are only kept for the columns of the batch, the vocabulary is much larger.
+            assigned = np.bincount(themes, minlength=len(centroids))
+            columns, positions = np.unique(batch_columns, return_inverse=True)
+            sums = np.bincount(np.repeat(themes, lengths[batch]) * len(columns) + positions,
+                               weights=values[batch_entries], minlength=len(centroids) * len(columns))
+            counts = counts + assigned
+            rate = assigned / np.maximum(counts, 1)
+            centroids *= (1 - rate)[:, None].astype(np.float32)
+            centroids[:, columns] += (sums.reshape(len(centroids), -1)
+                                      * (rate / np.maximum(assigned, 1))[:, None]).astype(np.float32)
+            norms = np.sqrt(np.einsum('ij,ij->i', centroids, centroids))
+            centroids /= np.where(norms > 0, norms, 1)[:, None]
+
+    return model._replace(centroids=centroids, counts=counts)
+
+
+def assign_themes(model: ThemeModel, index: TermIndex, batch_size: int = 16 * MINI_BATCH_SIZE) -> np.ndarray:
+    """ Theme of every subject of the index (NO_THEME for titles without known terms) """
+    columns = model.vocabulary.get_indexer(index.vocabulary)
+    idf = idf_weights(model)
+    number_of_subjects = len(index.indptr) - 1
+    themes = np.full(number_of_subjects, NO_THEME, dtype=np.int64)
+    for start in range(0, number_of_subjects, batch_size):
+        rows = np.arange(start, min(start + batch_size, number_of_subjects))
+        themes[rows] = nearest_centroids(model.centroids, *tfidf_vectors(index, rows, columns, idf))
+    return themes
+
+
+def theme_labels(model: ThemeModel, index: TermIndex, number_of_terms: int = LABEL_TERMS) -> List[str]:
+    """ Name of every theme: its most weighted terms, in their display form
+
+    Like the word clouds, the words of a bigram ('Deep Learning') are not shown
+    along with it, the bigram takes the place of its first word.
+    """
+    codes = index.vocabulary.get_indexer(model.vocabulary)
+    display = np.where(codes >= 0, np.asarray(index.labels, dtype=object)[codes], np.asarray(model.vocabulary))
+    parts = np.where(codes[:, None] >= 0, index.parts[codes], -1)
+    labels = []
+    for centroid in model.centroids:
+        terms: List[int] = []
+        for term in np.argsort(-centroid, kind='stable'):
+            if len(terms) == number_of_terms or centroid[term] <= 0:
+                break
+            if any(codes[term] in parts[chosen] for chosen in terms):
+                continue
+            words = [position for position, chosen in enumerate(terms) if codes[chosen] in parts[term]]
+            if words:
+                terms[words[0]] = term
+                terms = [chosen for position, chosen in enumerate(terms) if position not in words[1:]]
+            else:
+                terms.append(term)
+        labels.append(' · '.join(display[terms]))
+    return labels
+
+
+def teacher_mixtures(df: pd.DataFrame, subjects: np.ndarray, number_of_themes: int) -> np.ndarray:
+    """ Share of the subjects of every teacher (in the order of the categories) in every theme """
+    teachers = df['Teacher'].cat.codes.to_numpy().astype(np.int64)
+    kept = (subjects != NO_THEME) & (teachers >= 0)
+    counts = np.bincount(teachers[kept] * number_of_themes + subjects[kept],
+                         minlength=len(df['Teacher'].cat.categories) * number_of_themes)
+    counts = counts.reshape(-1, number_of_themes).astype(np.float32)
+    return counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+
+
+def read_themes(model_path: str) -> Tuple[Optional[ThemeModel], Optional[Themes], str]:
+    """ The model and the themes stored in a file, with the dataset version of the themes """
+    stored, version = read_arrays(model_path, MODEL_VERSION)
+    if stored is None:
+        return None, None, ''
+    model = ThemeModel(vocabulary=pd.Index(stored['vocabulary'].tolist(), dtype=object),
+                       centroids=stored['centroids'], counts=stored['counts'],
+                       document_frequencies=stored['document_frequencies'],
+                       number_of_documents=int(stored['number_of_documents']), years=stored['years'].tolist())
+    themes = Themes(labels=stored['labels'].tolist(), subjects=stored['subjects'],
+                    teachers=pd.Index(stored['teachers'].tolist(), dtype=object), mixtures=stored['mixtures'],
+                    neighbours=stored['neighbours'], similarities=stored['similarities'])
+    return model, themes, version
+
+
+def write_themes(model_path: str, model: ThemeModel, themes: Themes, version: str) -> None:
+    write_arrays(model_path, {**model._asdict(), **themes._asdict()}, version, MODEL_VERSION)
+
+
+def build_themes(df: pd.DataFrame, index: TermIndex, model_path: Optional[str] = None, version: str = '',
+                 retrain: bool = False) -> Themes:
+    """ The themes of the data, learnt only from the years the stored model has not seen
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The preprocessed data (see lib.preprocessing.prepare_data).
+    index : TermIndex
+        The tokenized titles (see lib.preprocessing.build_term_index).
+    model_path : str | None
+        File of the stored model and themes (see theme_model_path), None to
+        learn them in memory only.
+    version : str
+        Dataset version token of the data, the stored themes of the same version are reused.
+    retrain : bool
+        Learn the model from scratch.
+
+    Returns:
+    --------
+
+    themes : Themes
+    """
+
+    model, themes, stored_version = read_themes(model_path) if model_path and not retrain else (None, None, '')
+    if themes is not None and version and stored_version == version:
+        return themes
+
+    categories = df['Academic-year'].cat.categories
+    positions = group_positions(df['Academic-year'].cat.codes.to_numpy())
+    years: Dict[str, np.ndarray] = {categories[code]: rows for code, rows in positions.items() if code >= 0}
+    new_years = sorted(year for year in years if model is None or year not in model.years)
+    if new_years:
+        rows = np.sort(np.concatenate([years[year] for year in new_years]))
+        model = update_theme_model(model, index, rows, new_years)
+
+    subjects = assign_themes(model, index)
+    mixtures = teacher_mixtures(df, subjects, len(model.centroids))
+    neighbours, similarities = cosine_top_k(mixtures, SIMILAR_TEACHERS)
+    themes = Themes(labels=theme_labels(model, index), subjects=subjects, teachers=df['Teacher'].cat.categories,
+                    mixtures=mixtures, neighbours=neighbours, similarities=similarities)
+    if model_path:
+        try:
+            write_themes(model_path, model, themes, version)
+        except OSError:
+            # Read-only deployments learn the themes again at every start
+            pass
+    return themes
+
+
+def subject_themes(themes: Themes, rows: np.ndarray) -> pd.Series:
+    """ Number of the given subjects in every theme, most first """
+    subjects = themes.subjects[rows]
+    counts = np.bincount(subjects[subjects != NO_THEME], minlength=len(themes.labels))
+    counts = pd.Series(counts, index=themes.labels)
+    return counts[counts > 0].sort_values(ascending=False, kind='stable')
+
+
+def similar_teachers(themes: Themes, teacher: str) -> pd.DataFrame:
+    """ The teachers proposing subjects of the most similar themes
+
+    Returns:
+    --------
+
+    similar : pandas.core.frame.DataFrame
+        Most similar first, with the columns 'Teacher', 'Similarity (%)' and 'Main theme'.
+    """
+
+    position = themes.teachers.get_indexer([teacher])[0]
+    if position < 0:
+        return pd.DataFrame(columns=['Teacher', 'Similarity (%)', 'Main theme'])
+    found = themes.neighbours[position] >= 0
+    neighbours = themes.neighbours[position][found]
+    return pd.DataFrame({
+        'Teacher': themes.teachers[neighbours],
+        'Similarity (%)': (themes.similarities[position][found].astype(float) * 100).round(1),
+        'Main theme': np.asarray(themes.labels, dtype=object)[themes.mixtures[neighbours].argmax(axis=1)],
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Learn the themes of the subjects, from the new years only')
+    parser.add_argument('source', help='csv file or dataset store (see lib.ingest)')
+    parser.add_argument('--retrain', action='store_true', help='learn the model from scratch')
+    args = parser.parse_args()
+    df = prepare_data(args.source)
+    index = build_term_index(df['Title'], load_stop_words())
+    model_path = theme_model_path(args.source)
+    themes = build_themes(df, index, model_path, dataset_version(args.source), args.retrain)
+    print(f'{len(themes.labels)} themes written to {model_path}')
+    for label, count in subject_themes(themes, np.arange(len(df.index))).items():
+        print(f'  {count:6d}  {label}')
+
+
+if __name__ == '__main__':
+    main()
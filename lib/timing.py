@@ -0,0 +1,231 @@
+"""Timing and instrumentation
+
+Streamlit re-executes app.py on every interaction, but library modules are only
+imported once per process, so the start of the first script run and the startup
+timings are kept here.
+
+Every rerun is also instrumented: the loaders and the sections of the pages are
+wrapped with instrumented, which records their wall time, the number of rows they
+worked on and the change of the resident memory of the process. The spans of a
+rerun are emitted as one json log line when it finishes (see finish_rerun), and
+can be shown in the debug panel of the sidebar (streamlit_page/debug_panel.py).
+
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+START = time.perf_counter()
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger('master_subjects.startup')
+if not logger.handlers:
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# One json line per rerun, for log collectors
+rerun_logger = logging.getLogger('master_subjects.rerun')
+if not rerun_logger.handlers:
+    rerun_logger.addHandler(logging.StreamHandler())
+    rerun_logger.setLevel(logging.INFO)
+    rerun_logger.propagate = False
+
+_timings: Dict[str, float] = OrderedDict()
+_first_paint = None
+# Every session reruns the script in its own thread
+_rerun = threading.local()
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class Span(NamedTuple):
+    """ One instrumented call of a rerun
+
+    name : str
+    depth : int
+        Number of instrumented calls it was made from (0 for the top level ones).
+    seconds : float
+        Wall time of the call.
+    rows : int | None
+        Number of rows of the data it returned, or else of the first data it was given.
+    memory : int
+        Change of the resident memory of the process during the call, in bytes.
+        The process is shared by every session, so concurrent reruns add up.
+    """
+    name: str
+    depth: int
+    seconds: float
+    rows: Optional[int]
+    memory: int
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """ Record how long the block takes, the first time it runs in the process """
+    start = time.perf_counter()
+    yield
+    if name not in _timings:
+        _timings[name] = time.perf_counter() - start
+
+
+def mark_first_paint(page: str) -> None:
+    """ Log the startup report once, when the first page has been rendered
+
+    The time to first paint is measured from the import of this module by app.py.
+    """
+    global _first_paint
+    if _first_paint is None:
+        _first_paint = time.perf_counter() - START
+        logger.info(startup_report(page))
+
+
+def startup_report(page: str = '') -> str:
+    """ Human readable summary of the startup timings
+
+    Parameters:
+    -----------
+
+    page : str
+        Name of the page that was rendered first.
+
+    Returns:
+    --------
+
+    report : str
+    """
+
+    lines = [f"time to first paint{' (' + page + ')' if page else ''}: "
+             f"{_first_paint if _first_paint is not None else time.perf_counter() - START:.3f}s"]
+    lines += [f"  {name}: {seconds:.3f}s" for name, seconds in _timings.items()]
+    return '\n'.join(lines)
+
+
+def resident_memory() -> int:
+    """ Resident memory of the process in bytes (its peak where the current one is not available) """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        if resource is None:
+            return 0
+        # Kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if peak > 1 << 32 else peak * 1024
+
+
+def count_rows(value: Any) -> Optional[int]:
+    """ Number of rows of a loaded or aggregated value, None if it holds no rows
+
+    Frames, series and arrays count their rows, a cube (lib.aggregation) the
+    subjects it was built from, a profile (lib.profiles) its subjects, and a
+    (data, exception) pair of a loader its data.
+    """
+
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return None
+    subjects = getattr(value, 'subjects', None)
+    if subjects is not None and hasattr(subjects, 'columns') and 'count' in subjects.columns:
+        return int(subjects['count'].sum())
+    rows = getattr(value, 'rows', None)
+    if hasattr(rows, 'shape'):
+        return int(rows.shape[0])
+    shape = getattr(value, 'shape', None)
+    if shape:
+        return int(shape[0])
+    if type(value) is tuple and value:
+        return count_rows(value[0])
+    return None
+
+
+def start_rerun(page: str) -> None:
+    """ Start recording the spans of the rerun of this thread's session """
+    _rerun.page = page
+    _rerun.spans = []
+    _rerun.depth = 0
+    _rerun.start = time.perf_counter()
+    _rerun.memory = resident_memory()
+
+
+def rerun_spans() -> List[Span]:
+    """ Spans recorded so far in the rerun of this thread, in the order they started """
+    return [span for span in getattr(_rerun, 'spans', None) or [] if span is not None]
+
+
+def finish_rerun() -> Dict:
+    """ Stop recording the rerun of this thread and log it as one json line
+
+    Returns:
+    --------
+
+    dictionary with the page, the total seconds and memory change of the rerun,
+    the resident memory of the process and the spans (see Span)
+    """
+
+    memory = resident_memory()
+    record = {
+        'event': 'rerun',
+        'page': getattr(_rerun, 'page', ''),
+        'seconds': round(time.perf_counter() - getattr(_rerun, 'start', START), 6),
+        'memory': memory - getattr(_rerun, 'memory', memory),
+        'resident_memory': memory,
+        'spans': [dict(span._asdict(), seconds=round(span.seconds, 6)) for span in rerun_spans()],
+    }
+    _rerun.spans = None
+    rerun_logger.info(json.dumps(record))
+    return record
+
+
+def instrumented(name: Optional[str] = None) -> Callable:
+    """ Decorator recording a Span of every call made during a rerun
+
+    The rows are counted on the returned value, or else on the first argument
+    holding rows (see count_rows). Calls made outside of a rerun (see start_rerun) are not recorded.
+
+    Parameters:
+    -----------
+
+    name : str | None
+        Name of the span, the name of the function by default.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            spans = getattr(_rerun, 'spans', None)
+            if spans is None:
+                return function(*args, **kwargs)
+            # The slot is taken at the start, so nested calls are listed after their caller
+            position = len(spans)
+            spans.append(None)
+            depth = _rerun.depth
+            _rerun.depth += 1
+            memory = resident_memory()
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                _rerun.depth = depth
+            rows = count_rows(result)
+            for argument in (*args, *kwargs.values()):
+                if rows is not None:
+                    break
+                rows = count_rows(argument)
+            spans[position] = Span(span_name, depth, seconds, rows, resident_memory() - memory)
+            return result
+
+        return wrapper
+
+    return decorator
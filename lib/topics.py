@@ -0,0 +1,104 @@
+"""Topic tables
+
+The topics of a selection are filtered, sorted and paged as row positions into
+the shared data, only the rows of the page on screen are materialized. Exports
+are written chunk by chunk, so the full selection is never copied at once.
+
+"""
+from typing import BinaryIO, Dict, Hashable, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from lib.dataset import take
+
+PAGE_SIZE = 20
+EXPORT_CHUNK_SIZE = 10000
+EXPORT_FORMATS = {'CSV': ('csv', 'text/csv'), 'Parquet': ('parquet', 'application/octet-stream')}
+
+
+def filter_rows(df: pd.DataFrame, rows: np.ndarray, filters: Dict[str, Hashable]) -> np.ndarray:
+    """ Keep the rows whose columns equal the given values
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The shared data.
+    rows : numpy.ndarray
+        Row positions of the selection.
+    filters : dict
+        Value to keep by column, categorical columns are compared on their codes.
+
+    Returns:
+    --------
+
+    rows : numpy.ndarray
+        The positions that pass every filter, in the same order.
+    """
+
+    for column, value in filters.items():
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = values.cat.categories
+            code = categories.get_loc(value) if value in categories else -2
+            rows = rows[values.cat.codes.to_numpy()[rows] == code]
+        else:
+            rows = rows[values.to_numpy()[rows] == value]
+    return rows
+
+
+def sort_rows(df: pd.DataFrame, rows: np.ndarray, column: str, descending: bool = False) -> np.ndarray:
+    """ Order the rows on a column (stable, missing values last) """
+    values = df[column].take(rows).reset_index(drop=True)
+    order = values.sort_values(ascending=not descending, kind='stable', na_position='last').index
+    return rows[order.to_numpy()]
+
+
+def number_of_pages(rows: np.ndarray, page_size: int = PAGE_SIZE) -> int:
+    return max(1, -(-len(rows) // page_size))
+
+
+def page_rows(rows: np.ndarray, page: int, page_size: int = PAGE_SIZE) -> np.ndarray:
+    """ Positions of the rows shown on a page, pages are numbered from 1 """
+    start = (page - 1) * page_size
+    return rows[start:start + page_size]
+
+
+def write_export(df: pd.DataFrame, rows: np.ndarray, columns: Sequence[str], export_format: str,
+                 sink: BinaryIO, chunk_size: int = EXPORT_CHUNK_SIZE) -> None:
+    """ Write the selected topics to a binary file, one chunk of rows at a time
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The shared data.
+    rows : numpy.ndarray
+        Row positions of the topics, in the order they are written.
+    columns : list of str
+        The columns to write.
+    export_format : str
+        One of EXPORT_FORMATS.
+    sink : file object
+        Opened in binary mode.
+    chunk_size : int
+        Number of rows materialized at a time.
+    """
+
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format: {export_format}')
+    writer = None
+    for start in range(0, max(len(rows), 1), chunk_size):
+        chunk = take(df, rows[start:start + chunk_size], columns)
+        if export_format == 'CSV':
+            sink.write(chunk.to_csv(index=False, header=start == 0).encode('utf-8'))
+            continue
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+    if writer is not None:
+        writer.close()
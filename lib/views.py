@@ -0,0 +1,325 @@
+"""Page views
+
+The content of the pages, shared by the Streamlit pages (streamlit_page) and the
+static snapshot (lib.snapshot). Every section of a page is built here as a list
+of blocks (headings, markdown text, charts, metrics, tables, word clouds) from
+the aggregates, the pages draw them with Streamlit (see
+streamlit_page.blocks.render_blocks) and the snapshot writes them as HTML: a
+section changed here changes in both.
+
+The widgets stay in the pages: a section depending on a selection (e.g. the
+'Priority?' select box) takes the selected option, the snapshot builds it for
+every option.
+
+"""
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Union
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from lib.aggregation import Cube
+from lib.analytics import external_department_counts, grade_counts, taken_ratio, teacher_counts
+from lib.charts import MAX_BARS, bar_chart, bar_chart_spec, line_chart, pie_chart, top_n
+from lib.profiles import TeacherProfile
+from lib.recommendations import RANK_WEIGHTS, TeacherMatrix, nearest_teachers, recommended_teachers
+from lib.themes import Themes, similar_teachers, subject_themes
+from lib.years import YearIndex, speciality_trends, year_trends
+
+SPACES = '&nbsp;' * 10
+PRIORITY_OPTIONS = ('1', '2', '3', '4', '5', 'average')
+TOPIC_COLUMNS = ['Title', 'Taken', 'Priority 1', 'Priority 2', 'Priority 3', 'Priority 4', 'Priority 5',
+                 'Academic-year']
+
+
+class Heading(NamedTuple):
+    """ A title, level 1 to 3 like st.title, st.header and st.subheader """
+    text: str
+    level: int = 3
+
+
+class Text(NamedTuple):
+    """ Markdown text """
+    markdown: str
+
+
+class Chart(NamedTuple):
+    """ A chart of lib.charts
+
+    kind : str
+        'bar', 'pie' or 'line' (see CHARTS).
+    data : pandas.core.series.Series | pandas.core.frame.DataFrame
+        The aggregated values drawn.
+    options : dict
+        The other arguments of the chart function, e.g. the titles of the axes.
+    """
+    kind: str
+    data: Union[pd.Series, pd.DataFrame]
+    options: Dict[str, Any]
+
+
+class Metric(NamedTuple):
+    label: str
+    value: Any
+    delta: Any = None
+
+
+class Metrics(NamedTuple):
+    """ Metrics shown side by side """
+    metrics: List[Metric]
+
+
+class Table(NamedTuple):
+    """ A table, its index is shown when it is named (see lib.snapshot.table_html) """
+    frame: pd.DataFrame
+
+
+class Topics(NamedTuple):
+    """ The subjects at some row positions
+
+    rows : numpy.ndarray
+    columns : list of str
+    key : str
+        Identifies the table among the widgets of the page.
+    """
+    rows: np.ndarray
+    columns: List[str]
+    key: str
+
+
+class WordCloud(NamedTuple):
+    """ Word cloud of some subjects (see lib.word_cloud.word_cloud_image)
+
+    key : Hashable
+        Identifies the filter that selected the subjects, the rendered images are cached on it.
+    rows : numpy.ndarray | None
+        Row positions of the subjects, None means all of them.
+    frequencies : pandas.core.series.Series | None
+        Precomputed frequencies of the subjects, used instead of counting the terms of rows.
+    """
+    key: Hashable
+    rows: Optional[np.ndarray] = None
+    frequencies: Optional[pd.Series] = None
+
+
+Block = Union[Heading, Text, Chart, Metrics, Table, Topics, WordCloud]
+
+CHARTS = {'bar': bar_chart, 'pie': pie_chart, 'line': line_chart}
+
+
+def chart(block: Chart) -> alt.TopLevelMixin:
+    """ The altair chart of a chart block """
+    return CHARTS[block.kind](block.data, **block.options)
+
+
+def chart_spec(block: Chart) -> Dict:
+    """ The Vega-Lite spec of a chart block, the bars without building the altair chart (see bar_chart_spec) """
+    if block.kind == 'bar':
+        return bar_chart_spec(block.data, **block.options)
+    return chart(block).to_dict()
+
+
+def bar(values: pd.Series, value_title: str, label_title: str, **options) -> Chart:
+    return Chart('bar', values, dict(value_title=value_title, label_title=label_title, **options))
+
+
+def priority_chart(scores: pd.DataFrame, option: str, specialities: Optional[List[str]] = None) -> Chart:
+    """ Chart of an option of the 'Priority?' select box
+
+    Parameters:
+    -----------
+
+    scores : pandas.core.frame.DataFrame
+        Priority scores per speciality (see lib.scoring.speciality_scores).
+    option : str
+        One of PRIORITY_OPTIONS.
+    specialities : list of str | None
+        Every speciality, the ones missing from scores keep an average of 0.
+    """
+
+    if option == 'average':
+        if specialities is not None:
+            scores = scores.reindex(specialities)
+        average = top_n(scores['Average'].fillna(0), other=None)
+        return bar(average, 'Average priority', 'Speciality', median=scores['Median'])
+    return bar(top_n(scores['Priority ' + option][lambda counts: counts > 0]), 'Number of topics proposed',
+               'Speciality')
+
+
+# General Statistics
+
+def general_intro() -> List[Block]:
+    return [Text("This page contains basic exploratory data analyses for the purpose of getting a general "
+                 "feeling of what the data contains. "),
+            Text("There are several questions that this page tries to answer:"),
+            Text(f"{SPACES}🔹 Did every proposed topic get chosen by a student? "),
+            Text(f"{SPACES}🔹 Did all teachers propose the same number of topics? "),
+            Text(f"{SPACES}🔹 Do teachers' grades have any impact on the number of topics proposed? "),
+            Text(f"{SPACES}🔹 Did teachers from other departments propose a topic? "),
+            Text(f"{SPACES}🔹 What is the most prioritized specialty? ")]
+
+
+def topics_taken(cube: Cube) -> List[Block]:
+    taken = taken_ratio(cube)
+    return [Heading("Did every proposed topic get chosen by a student?"),
+            Text(f"From ___{taken['topics']}___ proposed topic, only ___{taken['taken']}___ got chosen"
+                 f" and ___{taken['not taken']}___ were left."),
+            Chart('pie', pd.Series([taken['taken'], taken['not taken']],
+                                   index=[f"taken {taken['percentage of taken']}%",
+                                          f"not taken {taken['percentage of not taken']}%"]), {})]
+
+
+def topics_per_teacher(cube: Cube, distinct_topics: Optional[pd.Series] = None) -> List[Block]:
+    """ distinct_topics : number of distinct subjects per teacher, counted instead of every subject """
+    topics = teacher_counts(cube) if distinct_topics is None else distinct_topics
+    proposed_3_or_more = int((topics >= 3).sum())
+    percentage_of_3_or_more = round(proposed_3_or_more / len(topics) * 100)
+    value_title = 'Total topics proposed' if distinct_topics is None else 'Distinct topics proposed'
+    return [Heading("Did all teachers propose the same number of topics?"),
+            Text("Below you can see the total number of proposed topics by some of the teachers,"),
+            bar(top_n(topics, MAX_BARS, other=None), value_title, 'Teacher', width=700, dx=3),
+            Text(f"🔹 from ___{len(topics)}___ teacher in total, only "
+                 f"___{proposed_3_or_more}({percentage_of_3_or_more}%)___  proposed 3 topics or more"),
+            Text(f"🔹 On average ___{round(topics.mean())}___ topic per teacher were proposed.")]
+
+
+def topics_per_grade(cube: Cube) -> List[Block]:
+    return [Heading("Which grade of teachers proposed the most subjects?"),
+            Text("Below you can see the total number of proposed topics for every grade:"),
+            bar(top_n(grade_counts(cube)), 'Total topics proposed', 'Grade')]
+
+
+def external_departments(cube: Cube) -> List[Block]:
+    return [Heading("Did teachers from other departments propose a topic?"),
+            bar(top_n(external_department_counts(cube)), 'Total topics proposed', 'Department', width=700, dx=3)]
+
+
+def prioritized_specialities_intro() -> List[Block]:
+    return [Heading('What is the most prioritized specialty?'),
+            Text("Each proposed topic have 5 priorities, for example:"),
+            Text("- A student who belongs to a speciality that have 'Priority 2' have more priority to take that "
+                 "topic more then students who belong to other speciality's that have priority 3,4 and 5"),
+            Text("- Below you can chose a priority and see how many times a speciality appeared"),
+            Text("- Or you can visualize the average priority for each speciality (the lower the better)")]
+
+
+def subjects_word_cloud(key: Hashable, rows: Optional[np.ndarray] = None) -> List[Block]:
+    return [Heading("Subjects Word Cloud"),
+            Text("The world cloud contains the most common words in the subjects titles. For example, Deep "
+                 "learning, Protocol, IOT, Detection are all common words."),
+            WordCloud(key, rows=rows)]
+
+
+# Teacher Statistics
+
+def teacher_intro() -> List[Block]:
+    return [Text("There are several things you see on this page:"),
+            Text(f"{SPACES}🔹 An overview of the teacher"),
+            Text(f"{SPACES}🔹 Teacher speciality prioritizing"),
+            Text(f"{SPACES}🔹 Teacher subjects word cloud."),
+            Text(f"{SPACES}🔹 Themes of the subjects and teachers with similar themes."),
+            Text(f"{SPACES}🔹 Similar teachers."),
+            Text(f"{SPACES}🔹 List of Proposed topics.")]
+
+
+def teacher_overview(profile: TeacherProfile, global_stats: Dict,
+                     distinct_topics: Optional[int] = None) -> List[Block]:
+    """ The grade, number of topics and percentage of taken of a teacher, compared to all the teachers """
+    percentage_of_taken = round(profile.number_of_topics_taken / profile.number_of_topics * 100)
+    if distinct_topics is None:
+        topics = Metric("Number of topics", profile.number_of_topics,
+                        profile.number_of_topics - global_stats['average publish'])
+    else:
+        topics = Metric("Number of distinct topics", distinct_topics,
+                        distinct_topics - global_stats['average distinct publish'])
+    return [Heading('Overview:'),
+            Metrics([Metric("Grade", profile.grade)]),
+            Metrics([topics, Metric("Percentage of taken", f'{percentage_of_taken}%',
+                                    f"{percentage_of_taken - global_stats['percentage of taken']}%")])]
+
+
+def teacher_priorities_intro() -> List[Block]:
+    return [Heading('Speciality prioritizing:'),
+            Text("You can see how many times each speciality was given a certain priority"),
+            Text("Or you can visualize the average priority for each speciality (**the lower the better**).")]
+
+
+def teacher_word_cloud(key: Hashable, frequencies: pd.Series) -> List[Block]:
+    return [Heading('Teacher subjects word cloud:'),
+            Text('The world cloud contains the most common words in the subjects titles proposed by this teacher:'),
+            WordCloud(key, frequencies=frequencies)]
+
+
+def teacher_themes(themes: Themes, teacher: str, rows: np.ndarray) -> List[Block]:
+    return [Heading('Themes of the subjects:'),
+            Text('Number of subjects of this teacher in every theme, a theme is named after its most important '
+                 'words:'),
+            bar(subject_themes(themes, rows), 'Number of topics proposed', 'Theme'),
+            Text('Teachers proposing subjects of the most similar themes (over all the academic years):'),
+            Table(similar_teachers(themes, teacher))]
+
+
+def teacher_similar_teachers(matrix: TeacherMatrix, teacher: str) -> List[Block]:
+    return [Heading('Similar teachers:'),
+            Text('Teachers with the closest speciality prioritizing, grade, percentage of taken and words in the '
+                 'subjects titles (over all the academic years):'),
+            Table(nearest_teachers(matrix, teacher))]
+
+
+def teacher_topics(rows: np.ndarray) -> List[Block]:
+    return [Heading('List of Proposed topics:'),
+            Text('Full list of proposed topics including other information.'),
+            Topics(rows, TOPIC_COLUMNS, key='teacher_topics')]
+
+
+# Academic Year Trends
+
+def trends_intro() -> List[Block]:
+    return [Text("This page compares the proposed topics across academic years."),
+            Text(f"{SPACES}🔹 Is there a big difference between the topics of two years?"),
+            Text(f"{SPACES}🔹 How did the prioritizing of the specialities change?")]
+
+
+def topics_per_year(year_index: YearIndex, years: List[str]) -> List[Block]:
+    """ years : at least two academic years, compared from the first to the last """
+    trends = year_trends(year_index, years)
+    first, last = trends.iloc[0], trends.iloc[-1]
+    return [Heading(f"How did the topics change from {years[0]} to {years[-1]}?"),
+            Metrics([Metric("Number of topics", int(last['Topics']), int(last['Topics'] - first['Topics'])),
+                     Metric("Percentage of taken", f"{last['Take rate (%)']}%",
+                            f"{round(last['Take rate (%)'] - first['Take rate (%)'], 1)}%"),
+                     Metric("Number of teachers", int(last['Teachers']), int(last['Teachers'] - first['Teachers']))]),
+            Chart('line', trends[['Topics', 'Taken']].T,
+                  dict(value_title='Number of topics', series_title='Topics')),
+            Table(trends)]
+
+
+def speciality_trends_intro() -> List[Block]:
+    return [Heading('How did the prioritizing of the specialities change?'),
+            Text("You can follow the average priority of each speciality (**the lower the better**),"
+                 " or how many topics gave it a certain priority.")]
+
+
+def speciality_trend_chart(year_index: YearIndex, years: List[str], option: str) -> Chart:
+    """ Chart of an option of the 'Priority?' select box over the academic years """
+    if option == 'average':
+        trends = speciality_trends(year_index, years, 'Average')
+        return Chart('line', trends, dict(value_title='Average priority', series_title='Speciality'))
+    trends = speciality_trends(year_index, years, 'Priority ' + option).fillna(0)
+    return Chart('line', trends, dict(value_title='Number of topics', series_title='Speciality'))
+
+
+# Teacher Finder
+
+def finder_intro() -> List[Block]:
+    return [Text("This page helps students find the teachers whose subjects fit their speciality."),
+            Text(f"{SPACES}🔹 Which teachers give the best priorities to my speciality?")]
+
+
+def teachers_for_speciality(matrix: TeacherMatrix, speciality: str) -> List[Block]:
+    weights = ', '.join(f'{weight:g}' for weight in RANK_WEIGHTS)
+    recommended = recommended_teachers(matrix, speciality)
+    return [Heading(f'Which teachers fit the {speciality} speciality?'),
+            Text(f"Every subject of a teacher that gives a priority to {speciality} counts in the fit of the "
+                 f"teacher, from Priority 1 to Priority 5 it counts for {weights} (over all the academic years)."),
+            Text("No teacher gave a priority to this speciality 😰") if recommended.empty else Table(recommended)]
@@ -0,0 +1,126 @@
+"""Warm-up
+
+The first visitor after a deploy would otherwise pay for loading the data,
+building its indexes and drawing the first word clouds. start_warmup runs these
+steps once per dataset version in a background thread pool, from the first
+script run of the process (Streamlit has no hook at server start, and its
+health check does not run the script): usually the homepage of the first
+visitor, which needs none of them.
+
+The loaders keep using their caches: a page asking for a result the warm-up
+already computed reads it from the cache, and one asking for a step the warm-up
+has not reached yet computes it on demand. A result that is being computed is
+waited for instead of being computed a second time (see single_flight), whether
+the warm-up or another session started it.
+
+"""
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from lib.timing import logger, timed
+
+WARMUP_WORKERS = 2
+# Keys warmed up in this process that are remembered, the oldest are forgotten first
+MAX_WARMUPS = 2
+
+_flights_lock = threading.Lock()
+_flights: Dict[Tuple, Future] = {}
+_warmups_lock = threading.Lock()
+_warmups: Dict[Hashable, List[Future]] = {}
+
+
+def call_key(function: Callable, args: tuple, kwargs: dict) -> Tuple:
+    """ Identifies a call by its arguments, the unhashable ones (the shared data) by their identity """
+    def key(value: Any) -> Hashable:
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return id(value)
+    return (function, tuple(key(arg) for arg in args), tuple(sorted((name, key(value))
+                                                                    for name, value in kwargs.items())))
+
+
+def single_flight(function: Callable) -> Callable:
+    """ Decorator sharing the result of a call with the identical calls made while it runs
+
+    Meant for the cached loaders: the first call computes the value (and fills the
+    cache), the calls made meanwhile from other threads wait for it, the calls
+    made afterwards call the function again and read its cache.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        key = call_key(function, args, kwargs)
+        with _flights_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = Future()
+        if not leader:
+            return flight.result()
+        try:
+            result = function(*args, **kwargs)
+            flight.set_result(result)
+            return result
+        except BaseException as exception:
+            flight.set_exception(exception)
+            raise
+        finally:
+            with _flights_lock:
+                del _flights[key]
+
+    return wrapper
+
+
+def run_step(name: str, step: Callable[[], Any]) -> None:
+    """ Run a warm-up step, its failure is logged and left for the page to raise again """
+    try:
+        with timed(f'warmup {name}'):
+            step()
+    except Exception as exception:
+        logger.warning(f'warm-up step {name} failed: {exception!r}')
+
+
+def start_warmup(key: Hashable, steps: List[Tuple[str, Callable[[], Any]]], workers: int = WARMUP_WORKERS,
+                 initializer: Optional[Callable[[], Any]] = None, max_warmups: int = MAX_WARMUPS) -> bool:
+    """ Run the steps in the background, once per key
+
+    Parameters:
+    -----------
+
+    key : Hashable
+        Identifies what is warmed up, e.g. (path, dataset version): a new key
+        (new data) is warmed up again, the same key only once per process.
+    steps : list of (str, callable)
+        Name and function of every step, started in this order. A step may call
+        the loader of another one, it then waits for it (see single_flight).
+    workers : int
+        Number of threads running the steps.
+    initializer : callable | None
+        Called first in every thread, e.g. to attach a script run context.
+    max_warmups : int
+        Number of keys remembered, e.g. the number of dataset versions kept in
+        the caches: a key forgotten for a newer one is warmed up again if it comes back.
+
+    Returns:
+    --------
+
+    started : bool
+        False when the key was already warmed up (or is being warmed up).
+    """
+
+    with _warmups_lock:
+        if key in _warmups:
+            return False
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='warmup', initializer=initializer)
+        _warmups[key] = [executor.submit(run_step, name, step) for name, step in steps]
+        # The dict keeps the insertion order, the oldest keys come first
+        for old_key in list(_warmups)[:-max_warmups]:
+            del _warmups[old_key]
+    # The threads exit once the steps are done, the script run does not wait for them
+    executor.shutdown(wait=False)
+    return True
+
@@ -2,22 +2,63 @@
 
 This script scrap master thesis topics data from my faculty website
 
+The HTML pages saved from the website are parsed in parallel and the topics are
+appended to a csv file in batches. The content hash of every page is recorded next
+to the csv, so running the script again only parses the new or changed pages.
+When a page changed, its topics are appended again: consumers keep the last row
+of every Id.
+
+Usage: python -m lib.web_scrapping --html-dir ../htmls --output subjects_master_2023_2.csv
+
 """
-from bs4 import BeautifulSoup
-import re
+import argparse
+import hashlib
+import json
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
 import pandas as pd
+from bs4 import BeautifulSoup
+
+try:  # lxml is several times faster than the pure python parser, but optional
+    import lxml  # noqa: F401
+    PARSER = 'lxml'
+except ImportError:
+    PARSER = 'html.parser'
+
+DATA_PATH = os.path.join('..', 'htmls')
+OUTPUT_PATH = 'subjects_master_2023_2.csv'
+BATCH_SIZE = 1000
+# Only these files of the pages directory are parsed (not the hashes, csv files or backups)
+PAGE_EXTENSIONS = ('.html', '.htm')
+COLUMNS = ['Id', 'Title', 'Author', 'Grade', 'Taken',
+           'Priority 1', 'Priority 2', 'Priority 3', 'Priority 4', 'Priority 5', 'Date', 'Time']
+
 
-DATA_PATH = r"..\\htmls\\"
+def parse_html(html_doc: str) -> List[Dict]:
+    """ Pull the topics out of a saved page of the website
 
+    Parameters:
+    -----------
 
-articles = []
-for file_name in os.listdir(DATA_PATH):  # Iterate over the HTML raw files
-    with open(DATA_PATH + file_name, "r",encoding='utf-8') as f:
-        html_doc = f.read()
-    soup = BeautifulSoup(html_doc, 'html.parser')
+    html_doc : str
+        Content of the HTML page.
+
+    Returns:
+    --------
+
+    articles : list of dict
+        One dictionary per topic, with the keys of COLUMNS.
+    """
+
+    articles = []
+    soup = BeautifulSoup(html_doc, PARSER)
     # Get table that contains the information we are interested in
     table = soup.find("table", {"id": "filterrific_results"})
+    if table is None:
+        return articles
     # get tags that contain usefull information
     rows = [content for content in table.contents if content.name]
     # split the tags per teacher
@@ -29,12 +70,11 @@ for file_name in os.listdir(DATA_PATH):  # Iterate over the HTML raw files
         # Pulling name and grade of each teacher:  'Enseignant NAME (GRADE)'
         text = teacher[0].th.text
         text = re.split(pattern='Enseignant', string=text)[1][2:]
-        text = re.split(pattern='\(', string=text)
+        text = re.split(pattern=r'\(', string=text)
         name = text[0].strip()
         grade = text[1][:-1]
         # splitting the data per article
         articles_teacher = teacher[1].find_all('tr')
-        print(f'{name}:{len(articles_teacher)}')
         # populating  articles information into a dictionary
         for article in articles_teacher:
             infos = article.find_all('td')
@@ -54,8 +94,131 @@ for file_name in os.listdir(DATA_PATH):  # Iterate over the HTML raw files
                 'Time': time,
             }
             articles.append(article_dict)
+    return articles
+
+
+def parse_file(job: Tuple[str, Optional[str]]) -> Tuple[str, str, Optional[List[Dict]]]:
+    """ Hash a saved page and parse it if it changed (runs in the worker processes)
+
+    Parameters:
+    -----------
+
+    job : tuple
+        Path of the page and the hash recorded for it last time (None if new).
+
+    Returns:
+    --------
+
+    path : str
+    sha256 : str
+        Hash of the current content of the page.
+    articles : list of dict | None
+        The topics of the page, None if it did not change.
+    """
+
+    path, known_sha256 = job
+    with open(path, 'rb') as f:
+        content = f.read()
+    sha256 = hashlib.sha256(content).hexdigest()
+    if sha256 == known_sha256:
+        return path, sha256, None
+    return path, sha256, parse_html(content.decode('utf-8'))
+
+
+def scrape_rows(html_dir: str, hashes: Dict[str, str],
+                workers: Optional[int] = None) -> Iterator[Tuple[str, str, Optional[List[Dict]]]]:
+    """ Parse the saved pages of a directory across a process pool, in file name order
+
+    Parameters:
+    -----------
+
+    html_dir : str
+        Directory of the saved HTML pages (PAGE_EXTENSIONS), other files are skipped.
+    hashes : dict
+        Hash recorded for every page file name during the previous run.
+    workers : int | None
+        Number of processes, defaults to the number of CPUs.
+
+    Yields:
+    -------
+
+    (file_name, sha256, articles) for every page, articles is None for unchanged pages.
+    """
+
+    file_names = sorted(file_name for file_name in os.listdir(html_dir)
+                        if file_name.lower().endswith(PAGE_EXTENSIONS)
+                        and os.path.isfile(os.path.join(html_dir, file_name)))
+    jobs = [(os.path.join(html_dir, file_name), hashes.get(file_name)) for file_name in file_names]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, sha256, articles in executor.map(parse_file, jobs, chunksize=4):
+            yield os.path.basename(path), sha256, articles
+
+
+def scrape(html_dir: str = DATA_PATH, output: str = OUTPUT_PATH,
+           workers: Optional[int] = None, batch_size: int = BATCH_SIZE) -> int:
+    """ Append the topics of the new or changed pages to the output csv
+
+    Parameters:
+    -----------
+
+    html_dir : str
+        Directory of the saved HTML pages.
+    output : str
+        The csv file the topics are appended to.
+    workers : int | None
+        Number of processes, defaults to the number of CPUs.
+    batch_size : int
+        Number of topics kept in memory before they are written out.
+
+    Returns:
+    --------
+
+    number_of_articles : int
+        Number of topics written.
+    """
+
+    state_path = output + '.hashes.json'
+    hashes = {}
+    if os.path.exists(state_path) and os.path.exists(output):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            hashes = json.load(f)
+
+    batch, pending, written = [], {}, 0
+
+    def flush() -> None:
+        nonlocal batch, pending
+        if batch:
+            pd.DataFrame(batch, columns=COLUMNS).to_csv(output, mode='a', index=None,
+                                                        header=not os.path.exists(output))
+        # Pages are only marked as done once their topics are on disk
+        hashes.update(pending)
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump(hashes, f, indent=1)
+        batch, pending = [], {}
+
+    for file_name, sha256, articles in scrape_rows(html_dir, hashes, workers):
+        if articles is None:
+            continue
+        print(f'{file_name}:{len(articles)}')
+        batch.extend(articles)
+        pending[file_name] = sha256
+        written += len(articles)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Scrap master thesis topics from saved HTML pages')
+    parser.add_argument('--html-dir', default=DATA_PATH, help='directory of the saved HTML pages')
+    parser.add_argument('--output', default=OUTPUT_PATH, help='csv file the topics are appended to')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: CPUs)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='topics written per batch')
+    args = parser.parse_args()
+    written = scrape(args.html_dir, args.output, args.workers, args.batch_size)
+    print(f'{written} topics written to {args.output}')
 
 
-# Saving in CSV
-df =  pd.DataFrame(articles)
-df.to_csv('subjects_master_2023_2.csv', index=None)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import io
+import threading
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from wordcloud import WordCloud
+
+from lib.preprocessing import TermIndex, cloud_frequencies
+
+MAX_CACHED_IMAGES = 64
+
+_images_lock = threading.Lock()
+
+
+class WordClouds(NamedTuple):
+    """ Word clouds of the subject titles
+
+    index : TermIndex
+        The tokenized titles (see lib.preprocessing.build_term_index).
+    images : collections.OrderedDict
+        Rendered word clouds (PNG bytes) by filter, least recently used first.
+    """
+    index: TermIndex
+    images: OrderedDict
+
+
+def build_word_clouds(index: TermIndex) -> WordClouds:
+    return WordClouds(index=index, images=OrderedDict())
+
+
+def render_word_cloud(frequencies: pd.Series) -> bytes:
+    """ Draw a word cloud of the given term frequencies as PNG bytes """
+    wordcloud = WordCloud().generate_from_frequencies(frequencies.to_dict())
+    buffer = io.BytesIO()
+    wordcloud.to_image().save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def word_cloud_image(word_clouds: WordClouds, key: Hashable, rows: Optional[np.ndarray] = None,
+                     frequencies: Optional[pd.Series] = None) -> Optional[bytes]:
+    """ Word cloud of some subjects, served from a bounded LRU cache of rendered images
+
+    Parameters:
+    -----------
+
+    word_clouds : WordClouds
+    key : Hashable
+        Identifies the filter that selected the rows, e.g. (year, teacher).
+    rows : numpy.ndarray | None
+        Row positions of the subjects, None means all of them.
+    frequencies : pandas.core.series.Series | None
+        Precomputed frequencies of the subjects (see cloud_frequencies), used
+        instead of counting the terms of rows.
+
+    Returns:
+    --------
+
+    image : bytes | None
+        The word cloud as PNG bytes, None if the subjects have no words to show.
+    """
+
+    images = word_clouds.images
+    with _images_lock:
+        if key in images:
+            images.move_to_end(key)
+            return images[key]
+
+    if frequencies is None:
+        frequencies = cloud_frequencies(word_clouds.index, rows)
+    image = render_word_cloud(frequencies) if len(frequencies) else None
+
+    with _images_lock:
+        images[key] = image
+        while len(images) > MAX_CACHED_IMAGES:
+            images.popitem(last=False)
+    return image
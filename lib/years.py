@@ -0,0 +1,187 @@
+"""Academic years
+
+The years are discovered from the data, and the aggregates of every year are
+computed from its slice of the cube. They are kept across dataset versions by
+a fingerprint of the year's subjects, so when the topics of a new year are
+appended only that year is sliced and aggregated again.
+
+"""
+import hashlib
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from lib.aggregation import Cube, slice_cube
+from lib.dataset import group_positions
+from lib.preprocessing import PRIORITY_COLUMNS
+from lib.scoring import speciality_scores
+
+ALL_YEARS = 'All Academic years'
+# Columns the aggregates of a year are computed from (the derived columns follow the Grade)
+FINGERPRINT_COLUMNS = ['Teacher', 'Grade', 'Taken'] + PRIORITY_COLUMNS
+
+_aggregates_lock = threading.Lock()
+_aggregates: Dict[Tuple[str, str], 'YearAggregates'] = {}
+
+
+class YearAggregates(NamedTuple):
+    """ Aggregates of the subjects of an academic year
+
+    fingerprint : str
+        Hash of the subjects of the year (see year_fingerprints).
+    cube : Cube
+        The cube restricted to the year.
+    number_of_topics : int
+    number_of_topics_taken : int
+    number_of_teachers : int
+    scores : pandas.core.frame.DataFrame
+        Rank statistics of the specialities (see lib.scoring.speciality_scores).
+    """
+    fingerprint: str
+    cube: Cube
+    number_of_topics: int
+    number_of_topics_taken: int
+    number_of_teachers: int
+    scores: pd.DataFrame
+
+
+class YearIndex(NamedTuple):
+    """ The year dimension of the data
+
+    years : list of str
+        The academic years holding subjects, oldest first.
+    rows : dict
+        Row positions of the subjects of every year, ascending.
+    aggregates : dict
+        YearAggregates of every year.
+    """
+    years: List[str]
+    rows: Dict[str, np.ndarray]
+    aggregates: Dict[str, YearAggregates]
+
+
+def year_fingerprints(df: pd.DataFrame, rows: Dict[str, np.ndarray]) -> Dict[str, str]:
+    """ Hash of the FINGERPRINT_COLUMNS of the subjects of every year, in row order
+
+    The categorical columns are hashed on their values, not their codes, so the
+    fingerprint of a year does not change when another year adds categories.
+    """
+    hashes = pd.util.hash_pandas_object(df[FINGERPRINT_COLUMNS], index=False).to_numpy()
+    return {year: hashlib.sha256(hashes[year_rows].tobytes()).hexdigest() for year, year_rows in rows.items()}
+
+
+def aggregate_year(cube: Cube, fingerprint: str) -> YearAggregates:
+    subjects = cube.subjects
+    return YearAggregates(
+        fingerprint=fingerprint,
+        cube=cube,
+        number_of_topics=int(subjects['count'].sum()),
+        number_of_topics_taken=int(subjects.loc[subjects['Taken'], 'count'].sum()),
+        number_of_teachers=subjects.loc[subjects['count'] > 0, 'Teacher'].nunique(),
+        scores=speciality_scores(cube),
+    )
+
+
+def build_year_index(df: pd.DataFrame, cube: Cube) -> YearIndex:
+    """ Discover the academic years and aggregate the ones whose subjects changed
+
+    The aggregates of the years with the same fingerprint in the previous index
+    built are reused, the other years are sliced from the cube and aggregated.
+
+    Parameters:
+    -----------
+
+    df : pandas.core.frame.DataFrame
+        The preprocessed data (see lib.preprocessing.prepare_data).
+    cube : Cube
+        The pre-aggregated counts of the data (see lib.aggregation.build_cube).
+
+    Returns:
+    --------
+
+    year_index : YearIndex
+    """
+
+    categories = df['Academic-year'].cat.categories
+    positions = group_positions(df['Academic-year'].cat.codes.to_numpy())
+    rows = {categories[code]: positions[code] for code in sorted(positions) if code >= 0}
+    years = sorted(rows)
+
+    fingerprints = year_fingerprints(df, rows)
+    aggregates = {}
+    for year in years:
+        with _aggregates_lock:
+            previous = _aggregates.get((year, fingerprints[year]))
+        if previous is None:
+            previous = aggregate_year(slice_cube(cube, year=year), fingerprints[year])
+        aggregates[year] = previous
+
+    with _aggregates_lock:
+        # Only the aggregates of the last index built are kept
+        _aggregates.clear()
+        _aggregates.update({(year, aggregate.fingerprint): aggregate for year, aggregate in aggregates.items()})
+    return YearIndex(years=years, rows=rows, aggregates=aggregates)
+
+
+def year_options(year_index: YearIndex) -> List[str]:
+    """ Choices of the year filters of the pages: all the years, then the most recent first """
+    return [ALL_YEARS] + year_index.years[::-1]
+
+
+def selected_years(year_index: YearIndex, first: Optional[str] = None, last: Optional[str] = None) -> List[str]:
+    """ The years of the index between first and last (included) """
+    return [year for year in year_index.years
+            if (first is None or year >= first) and (last is None or year <= last)]
+
+
+def year_trends(year_index: YearIndex, years: List[str]) -> pd.DataFrame:
+    """ Number of topics, of taken topics, take rate and number of teachers per year
+
+    Parameters:
+    -----------
+
+    year_index : YearIndex
+    years : list of str
+        The years to compare.
+
+    Returns:
+    --------
+
+    trends : pandas.core.frame.DataFrame
+        Indexed by year, with the columns 'Topics', 'Taken', 'Take rate (%)' and 'Teachers'.
+    """
+
+    aggregates = [year_index.aggregates[year] for year in years]
+    trends = pd.DataFrame({
+        'Topics': [aggregate.number_of_topics for aggregate in aggregates],
+        'Taken': [aggregate.number_of_topics_taken for aggregate in aggregates],
+        'Teachers': [aggregate.number_of_teachers for aggregate in aggregates],
+    }, index=pd.Index(years, name='Academic-year'))
+    trends.insert(2, 'Take rate (%)', (trends['Taken'] / trends['Topics'].clip(lower=1) * 100).round(1))
+    return trends
+
+
+def speciality_trends(year_index: YearIndex, years: List[str], column: str = 'Average') -> pd.DataFrame:
+    """ A rank statistic of every speciality per year
+
+    Parameters:
+    -----------
+
+    year_index : YearIndex
+    years : list of str
+        The years to compare.
+    column : str
+        One of the columns of lib.scoring.speciality_scores ('Average', 'Priority 1', ...).
+
+    Returns:
+    --------
+
+    trends : pandas.core.frame.DataFrame
+        Indexed by speciality, one column per year.
+    """
+
+    trends = pd.DataFrame({year: year_index.aggregates[year].scores[column] for year in years})
+    trends.columns.name = 'Academic-year'
+    return trends.sort_index()
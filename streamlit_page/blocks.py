@@ -0,0 +1,52 @@
+from typing import TYPE_CHECKING, List, Optional
+
+import pandas as pd
+import streamlit as st
+
+from lib.views import Block, Chart, Heading, Metrics, Table, Text, Topics, WordCloud, chart
+from streamlit_page.topics_table import topics_table
+
+if TYPE_CHECKING:
+    from lib.word_cloud import WordClouds
+
+HEADINGS = {1: st.title, 2: st.header, 3: st.subheader}
+
+
+def render_blocks(blocks: List[Block], word_clouds: Optional['WordClouds'] = None,
+                  df: Optional[pd.DataFrame] = None) -> None:
+    """ Draw the blocks of a section of a page (see lib.views)
+
+    Parameters:
+    -----------
+
+    blocks : list of Block
+    word_clouds : WordClouds | None
+        The word clouds of the data, needed by the word cloud blocks.
+    df : pandas.core.frame.DataFrame | None
+        The data, needed by the topics blocks.
+    """
+
+    for block in blocks:
+        if isinstance(block, Heading):
+            HEADINGS[block.level](block.text)
+        elif isinstance(block, Text):
+            st.markdown(block.markdown)
+        elif isinstance(block, Chart):
+            st.write(chart(block))
+        elif isinstance(block, Metrics):
+            if len(block.metrics) == 1:
+                st.metric(*block.metrics[0])
+            else:
+                for column, metric in zip(st.columns(len(block.metrics)), block.metrics):
+                    column.metric(*metric)
+        elif isinstance(block, Table):
+            st.dataframe(block.frame, use_container_width=True)
+        elif isinstance(block, Topics):
+            topics_table(df, block.rows, columns=block.columns, key=block.key)
+        elif isinstance(block, WordCloud):
+            # Imported on the first word cloud, wordcloud takes long to import
+            from lib.word_cloud import word_cloud_image
+            # Rendered once per filter, then served from the cache
+            image = word_cloud_image(word_clouds, key=block.key, rows=block.rows, frequencies=block.frequencies)
+            if image is not None:
+                st.image(image, use_column_width=True)
@@ -0,0 +1,38 @@
+from typing import Dict
+
+import pandas as pd
+import streamlit as st
+
+# Open the app with ?debug=1 to show the panel
+DEBUG_PARAMETER = 'debug'
+MEGABYTE = 1024 * 1024
+
+
+def debug_enabled() -> bool:
+    """ Whether the debug panel was asked for in the url """
+    values = st.experimental_get_query_params().get(DEBUG_PARAMETER, [])
+    return any(value not in ('', '0', 'false') for value in values)
+
+
+def debug_panel(record: Dict) -> None:
+    """ Timings of the last rerun in the sidebar
+
+    Parameters:
+    -----------
+    record : Dict
+        The rerun as logged by lib.timing.finish_rerun
+    """
+
+    with st.sidebar.expander('⏱ Rerun timings', expanded=True):
+        st.markdown(f"**{record['page']}**: {record['seconds']:.3f}s, "
+                    f"memory {record['memory'] / MEGABYTE:+.1f} MB "
+                    f"(process {record['resident_memory'] / MEGABYTE:.0f} MB)")
+        spans = pd.DataFrame(record['spans'], columns=['name', 'depth', 'seconds', 'rows', 'memory'])
+        spans = pd.DataFrame({
+            # Nested calls are indented under the call they were made from
+            'step': ['· ' * depth + name for name, depth in zip(spans['name'], spans['depth'])],
+            'ms': (spans['seconds'] * 1000).round(1),
+            'rows': spans['rows'].astype('Int64'),
+            'memory (MB)': (spans['memory'] / MEGABYTE).round(1),
+        })
+        st.dataframe(spans, use_container_width=True)
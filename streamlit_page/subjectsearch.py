@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from typing import Dict, Tuple
+
+from lib.dataset import take
+from lib.search import SearchIndex, search
+from lib.years import ALL_YEARS, YearIndex, year_options
+
+SPACES = '&nbsp;' * 10
+MAX_RESULTS = 50
+
+
+def load_page(df: pd.DataFrame, global_stats: Dict, search_index: SearchIndex, year_index: YearIndex) -> None:
+    """ The Subject Search Page
+    Parameters:
+    -----------
+    df : pandas.core.frame.DataFrame
+        The data to be used for the analyses of proposed thesis subjects
+    global_stats : Dict
+        dictionary in the form 'global_stat_name:value'
+    search_index : SearchIndex
+        The ranking index of the subject titles (see lib.search.build_search_index)
+    year_index : YearIndex
+        The academic years of the data (see lib.years.build_year_index)
+    """
+
+    query, selected_year, selected_speciality, selected_taken = prepare_layout(global_stats['speciality list'],
+                                                                               year_options(year_index))
+    if not query.strip():
+        st.markdown("Type one or more keywords above, e.g. ___deep learning___, ___IoT___ or ___réseaux___.")
+        return
+
+    mask = filter_mask(df, year_index, selected_year, selected_speciality, selected_taken)
+    scores = search(search_index, query, mask=mask, limit=MAX_RESULTS)
+    list_of_results(df, scores)
+
+
+def prepare_layout(speciality_list: list, year_list: list) -> Tuple[str, str, str, str]:
+    """ Prepare the search box, the filters and the text of the page at the top """
+    st.title("🔎 Subject Search")
+    selected_year = st.sidebar.radio('Select Academic year', year_list)
+    selected_speciality = st.sidebar.selectbox('Speciality with priority 1', ['All specialities'] + sorted(speciality_list))
+    selected_taken = st.sidebar.radio('Taken by a student', ('All subjects', 'Taken', 'Not taken'))
+    st.write("Find proposed subjects by keywords, the most relevant titles come first.")
+    st.markdown("{}🔹 Accents and upper case letters are ignored.".format(SPACES))
+    st.markdown("{}🔹 Use the sidebar to filter by year, speciality and taken status.".format(SPACES))
+    query = st.text_input('Keywords')
+    return query, selected_year, selected_speciality, selected_taken
+
+
+def filter_mask(df: pd.DataFrame, year_index: YearIndex, selected_year: str, selected_speciality: str,
+                selected_taken: str) -> np.ndarray:
+    """ Boolean array of the subjects that pass the sidebar filters """
+    if selected_year != ALL_YEARS:
+        mask = np.zeros(len(df.index), dtype=bool)
+        mask[year_index.rows[selected_year]] = True
+    else:
+        mask = np.ones(len(df.index), dtype=bool)
+    if selected_speciality != 'All specialities':
+        mask &= (df['Priority 1'] == selected_speciality).to_numpy()
+    if selected_taken != 'All subjects':
+        mask &= df['Taken'].to_numpy() == (selected_taken == 'Taken')
+    return mask
+
+
+def list_of_results(df: pd.DataFrame, scores: pd.Series) -> None:
+    if scores.empty:
+        st.subheader("No subject matches these keywords 😰")
+        return
+
+    st.subheader(f'{len(scores)} most relevant subjects:')
+    results = take(df, scores.index.to_numpy(), ['Title', 'Teacher', 'Academic-year', 'Taken', 'Priority 1'])
+    results.insert(0, 'Score', scores.round(2).to_numpy())
+    st.table(results.reset_index(drop=True))
@@ -0,0 +1,33 @@
+import streamlit as st
+
+from lib import views
+from lib.recommendations import TeacherMatrix
+from lib.timing import instrumented
+from streamlit_page.blocks import render_blocks
+
+
+def load_page(matrix: TeacherMatrix) -> None:
+    """ The Teacher Finder Page
+    Parameters:
+    -----------
+    matrix : TeacherMatrix
+        The features of the teachers and their precomputed rankings
+        (see lib.recommendations.build_teacher_matrix)
+    """
+
+    speciality = prepare_layout(list(matrix.specialities))
+    teachers_for_speciality(matrix, speciality)
+
+
+def prepare_layout(speciality_list: list) -> str:
+    """ Prepare the speciality selection and the text of the page at the top, returns the selected speciality """
+    st.title("🎓 Teacher Finder")
+    speciality = st.sidebar.selectbox('Select your speciality', speciality_list)
+    render_blocks(views.finder_intro())
+    st.write(" ")
+    return speciality
+
+
+@instrumented()
+def teachers_for_speciality(matrix: TeacherMatrix, speciality: str) -> None:
+    render_blocks(views.teachers_for_speciality(matrix, speciality))
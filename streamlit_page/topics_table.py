@@ -0,0 +1,69 @@
+import io
+from typing import List
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from lib.dataset import take
+from lib.topics import (EXPORT_FORMATS, PAGE_SIZE, filter_rows, number_of_pages, page_rows, sort_rows,
+                        write_export)
+
+def topics_table(df: pd.DataFrame, rows: np.ndarray, columns: List[str], key: str) -> None:
+    """ Paginated table of topics, sorted and filtered on the server
+
+    Only the rows of the current page are sent to the browser, the export
+    contains every topic of the selection that passes the filters. It is only
+    encoded when asked for, and not kept once its download button is shown.
+
+    Parameters:
+    -----------
+    df : pandas.core.frame.DataFrame
+        The shared data (read-only)
+    rows : numpy.ndarray
+        Row positions of the topics of the selection
+    columns : list of str
+        The columns to show and export
+    key : str
+        Prefix of the widget keys, unique per table of a page
+    """
+
+    filters = {}
+    selected_taken = st.selectbox('Taken by a student', ('All subjects', 'Taken', 'Not taken'),
+                                  key=f'{key}_taken')
+    if selected_taken != 'All subjects':
+        filters['Taken'] = selected_taken == 'Taken'
+    specialities = sorted(df['Priority 1'].take(rows).dropna().unique())
+    selected_speciality = st.selectbox('Speciality with priority 1', ['All specialities'] + specialities,
+                                       key=f'{key}_speciality')
+    if selected_speciality != 'All specialities':
+        filters['Priority 1'] = selected_speciality
+    sort_column = st.selectbox('Sort by', ['Publication order'] + columns, key=f'{key}_sort')
+    order = st.selectbox('Order', ('Ascending', 'Descending'), key=f'{key}_order')
+
+    rows = filter_rows(df, rows, filters)
+    if sort_column != 'Publication order':
+        rows = sort_rows(df, rows, sort_column, descending=order == 'Descending')
+    elif order == 'Descending':
+        rows = rows[::-1]
+    if not len(rows):
+        st.write("No topic passes these filters.")
+        return
+
+    pages = number_of_pages(rows)
+    page = st.number_input(f'Page (of {pages})', min_value=1, max_value=pages, value=1, step=1,
+                           key=f'{key}_page') if pages > 1 else 1
+    shown = page_rows(rows, int(page))
+    start = (int(page) - 1) * PAGE_SIZE
+    st.caption(f'Topics {start + 1} to {start + len(shown)} of {len(rows)}')
+    st.dataframe(take(df, shown, columns), use_container_width=True)
+
+    export_format = st.selectbox('Export the topics', ['No export'] + list(EXPORT_FORMATS),
+                                 key=f'{key}_export')
+    if export_format != 'No export' and st.button(f'Prepare the {export_format} export', key=f'{key}_prepare'):
+        extension, mime = EXPORT_FORMATS[export_format]
+        # The rows are written chunk by chunk, only the encoded file is held for the download
+        export = io.BytesIO()
+        write_export(df, rows, columns, export_format, export)
+        st.download_button(f'Download {export_format}', data=export.getvalue(), file_name=f'{key}.{extension}',
+                           mime=mime, key=f'{key}_download')
@@ -0,0 +1,44 @@
+import streamlit as st
+from typing import List
+
+from lib import views
+from lib.years import YearIndex, selected_years
+from streamlit_page.blocks import render_blocks
+
+
+def load_page(year_index: YearIndex) -> None:
+    """ The Academic Year Trends Page
+    Parameters:
+    -----------
+    year_index : YearIndex
+        The per year aggregates of the data (see lib.years.build_year_index)
+    """
+
+    years = prepare_layout(year_index)
+    if len(years) < 2:
+        st.subheader("Select at least two academic years to compare them 😰")
+        return
+
+    number_of_topics_per_year(year_index, years)
+    speciality_prioritizing_per_year(year_index, years)
+
+
+def prepare_layout(year_index: YearIndex) -> List[str]:
+    """ Prepare the year range selection and the text of the page at the top """
+    st.title("📈 Academic Year Trends")
+    first, last = year_index.years[0], year_index.years[-1]
+    if len(year_index.years) > 1:
+        first, last = st.sidebar.select_slider('Academic years', options=year_index.years, value=(first, last))
+    render_blocks(views.trends_intro())
+    st.write(" ")
+    return selected_years(year_index, first, last)
+
+
+def number_of_topics_per_year(year_index: YearIndex, years: List[str]) -> None:
+    render_blocks(views.topics_per_year(year_index, years))
+
+
+def speciality_prioritizing_per_year(year_index: YearIndex, years: List[str]) -> None:
+    render_blocks(views.speciality_trends_intro())
+    option = st.selectbox('Priority?', ('average', '1', '2', '3', '4', '5'), key='trends_priority')
+    render_blocks([views.speciality_trend_chart(year_index, years, option)])